@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sync-agent-setup.py hot paths.
+
+- scanner: precompiled SecretScanner vs the original per-pattern regex loops
+  on large markdown command files (output must be byte-identical)
+- walk: pruned os.scandir walk vs the original rglob + should_exclude filter
+  on a synthetic tree with large excluded directories
+- pipeline: SyncEngine.apply (cold, warm with manifest, warm --full), sync_file,
+  sanitize_api_keys and check_sensitive_content on a synthetic ~/.claude tree
+  with a configurable size, secret mix and excluded directories
+
+Results can be written to JSON (--json) to compare runs for regressions.
+"""
+
+import argparse
+import importlib.util
+import json
+import platform
+import random
+import re
+import shutil
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+COMMANDS_DIR = SCRIPT_DIR.parent
+
+
+def load_sync_module():
+    """Import sync-agent-setup.py (hyphenated name, so not importable directly)."""
+    spec = importlib.util.spec_from_file_location("sync_agent_setup", SCRIPT_DIR / "sync-agent-setup.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_sanitize(sync, content: str, filepath: Path) -> tuple[str, int, list[str]]:
+    """The original pipeline: one re.subn/re.search pass per pattern."""
+    count = 0
+    for pattern, replacement in sync.API_KEY_SANITIZE:
+        new_content, n = re.subn(pattern, replacement, content)
+        if n > 0:
+            count += n
+            content = new_content
+    for pattern, replacement in sync.PATH_SANITIZE:
+        content = re.sub(pattern, replacement, content)
+
+    warnings = []
+    if not any(re.search(p, content) for p in sync.SAFE_PATTERNS):
+        for pattern in sync.SENSITIVE_PATTERNS:
+            if re.findall(pattern, content):
+                warnings.append(f"  - Potential sensitive data ({pattern[:25]}...) in {filepath}")
+    return content, count, warnings
+
+
+def legacy_should_exclude(sync, path: Path) -> bool:
+    """The original exclusion test: substring match against the full path."""
+    path_str = str(path)
+    name = path.name
+    for pattern in sync.EXCLUDE_PATTERNS:
+        if pattern in path_str or name == pattern or name.endswith(pattern):
+            return True
+    return "retired" in path.parts
+
+
+def legacy_walk(sync, root: Path) -> list[Path]:
+    """The original walk: descend everything, filter afterwards.
+
+    Paths are tested relative to root; against the full path the substring
+    test would drop everything under a temp dir ("tmp").
+    """
+    return [
+        item for item in root.rglob("*")
+        if item.is_file() and not legacy_should_exclude(sync, item.relative_to(root))
+    ]
+
+
+def make_walk_tree(root: Path, files: int, excluded_files: int) -> None:
+    """Build a ~/.claude-like tree: synced commands/skills plus big excluded dirs."""
+    for i in range(files):
+        folder = root / ("commands" if i % 2 else "skills") / f"group{i % 25}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"file{i}.md").write_text("# synthetic\n", encoding="utf-8")
+    for i in range(excluded_files):
+        folder = root / ("projects", "node_modules", "file-history", "shell-snapshots")[i % 4] / f"d{i % 50}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"blob{i}.json").write_text("{}", encoding="utf-8")
+
+
+def bench_walk(sync, root: Optional[Path], files: int, excluded_files: int, repeat: int) -> list[dict]:
+    tmp = None
+    if root is None:
+        tmp = Path(tempfile.mkdtemp(prefix="bench-walk-"))
+        root = tmp / "claude"
+        make_walk_tree(root, files, excluded_files)
+    try:
+        print(f"\nWalk: {root}, best of {repeat}")
+        legacy = best_of(repeat, legacy_walk, sync, root)
+        walker = best_of(repeat, lambda: list(sync.walk_files(root)))
+        walked = set(sync.walk_files(root))
+        legacy_files = set(legacy_walk(sync, root))
+        found = len(walked)
+        print(f"  legacy rglob + filter: {legacy * 1000:>9.2f}ms ({len(legacy_files)} files)")
+        print(f"  pruned scandir walk:   {walker * 1000:>9.2f}ms ({found} files)")
+        print(f"  speedup:               {legacy / walker:>9.1f}x")
+        if walked != legacy_files:
+            # Timings only compare like with like when both walks keep the same files
+            print(f"  WARNING: file sets differ ({len(walked - legacy_files)} only in walk, "
+                  f"{len(legacy_files - walked)} only in legacy)")
+        return [result("walk/legacy", legacy, files=found), result("walk/scandir", walker, files=found)]
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def best_of(repeat: int, func, *args, setup=None) -> float:
+    """Best wall time of func(*args) over repeat runs; setup() runs untimed before each."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def result(name: str, seconds: float, files: int = 0, size: int = 0) -> dict:
+    """One row of the JSON report."""
+    row = {"bench": name, "seconds": round(seconds, 6), "files": files, "bytes": size}
+    if size:
+        row["mb_per_s"] = round(size / seconds / 1e6, 2)
+    return row
+
+
+def bench_scanner(sync, files: list[Path], scale: int, repeat: int) -> list[dict]:
+    print(f"\nScanner: {len(files)} file(s) x{scale}, best of {repeat}")
+    print(f"  {'file':<40} {'size':>10} {'legacy':>10} {'scanner':>10} {'speedup':>8}")
+    total_legacy = total_scanner = 0.0
+    total_size = 0
+    for path in files:
+        content = path.read_text(encoding="utf-8", errors="replace") * scale
+
+        expected = legacy_sanitize(sync, content, path)
+        actual = sync.SCANNER.scan(content, path)
+        if expected != actual:
+            print(f"  MISMATCH: {path}")
+            sys.exit(1)
+
+        legacy = best_of(repeat, legacy_sanitize, sync, content, path)
+        scanner = best_of(repeat, sync.SCANNER.scan, content, path)
+        total_legacy += legacy
+        total_scanner += scanner
+        total_size += len(content)
+        print(f"  {path.name[:40]:<40} {len(content):>10} {legacy * 1000:>8.2f}ms {scanner * 1000:>8.2f}ms "
+              f"{legacy / scanner:>7.1f}x")
+    print(f"  {'TOTAL':<40} {'':>10} {total_legacy * 1000:>8.2f}ms {total_scanner * 1000:>8.2f}ms "
+          f"{total_legacy / total_scanner:>7.1f}x")
+    return [result("scanner/legacy", total_legacy, len(files), total_size),
+            result("scanner/scan", total_scanner, len(files), total_size)]
+
+
+# Secrets in the forms API_KEY_SANITIZE rewrites, plus one it only warns about
+def _rand(rnd: random.Random, alphabet: str, n: int) -> str:
+    return "".join(rnd.choice(alphabet) for _ in range(n))
+
+
+SECRET_MAKERS = [
+    lambda rnd: f"GEMINI_API_KEY=AIzaSy{_rand(rnd, string.ascii_letters + string.digits, 33)} gemini -p",
+    lambda rnd: f"OPENAI_API_KEY=sk-{_rand(rnd, string.ascii_letters + string.digits, 48)}",
+    lambda rnd: f'client = genai.Client(api_key="AIzaSy{_rand(rnd, string.ascii_letters, 33)}")',
+    lambda rnd: f"FIRECRAWL_API_KEY=fc-{_rand(rnd, '0123456789abcdef', 32)}",
+    lambda rnd: f"Use `sk-{_rand(rnd, string.ascii_letters, 48)}` as the key",
+    lambda rnd: f"token ghp_{_rand(rnd, string.ascii_letters + string.digits, 36)} (warned, not rewritten)",
+]
+
+FILLER_LINES = [
+    "## Instructions",
+    "Run the command below and review the output before continuing.",
+    "- Read the relevant files in C:\\Users\\alice\\Projects\\app before editing",
+    "```bash\ngit status && git diff --stat\n```",
+    "Use the Task tool to delegate research to a subagent when the scope is large.",
+    "| Step | Description |\n|------|-------------|\n| 1 | Plan |",
+]
+
+SUFFIXES = [".md"] * 7 + [".py", ".json", ".sh"]
+
+
+def make_sync_tree(root: Path, files: int, size_kb: float, secret_ratio: float,
+                   excluded_files: int, binary_ratio: float = 0.02, seed: int = 1) -> tuple[int, int]:
+    """Build a synthetic ~/.claude: commands/skills/agents text files, a few binaries,
+    a share of files with secrets, and large excluded directories.
+
+    Returns (synced files, total bytes of synced files).
+    """
+    rnd = random.Random(seed)
+    total = 0
+    for i in range(files):
+        folder = root / ("commands", "skills", "agents", "hooks")[i % 4] / f"group{i % 20}"
+        folder.mkdir(parents=True, exist_ok=True)
+        if rnd.random() < binary_ratio:
+            data = rnd.randbytes(max(1, int(size_kb * 1024)))
+            (folder / f"asset{i}.png").write_bytes(data)
+            total += len(data)
+            continue
+        # Sizes vary around the mean so the process-pool threshold is exercised
+        target = max(64, int(rnd.expovariate(1 / (size_kb * 1024))))
+        lines, size = [f"# Synthetic file {i}"], 0
+        while size < target:
+            line = rnd.choice(FILLER_LINES)
+            lines.append(line)
+            size += len(line) + 1
+        if rnd.random() < secret_ratio:
+            for _ in range(rnd.randint(1, 3)):
+                lines.insert(rnd.randrange(len(lines)), rnd.choice(SECRET_MAKERS)(rnd))
+        data = "\n".join(lines) + "\n"
+        (folder / f"file{i}{SUFFIXES[i % len(SUFFIXES)]}").write_text(data, encoding="utf-8")
+        total += len(data.encode("utf-8"))
+    for i in range(excluded_files):
+        folder = root / ("projects", "node_modules", "file-history", "todos")[i % 4] / f"d{i % 50}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"blob{i}.json").write_text('{"excluded": true}', encoding="utf-8")
+    return files, total
+
+
+def bench_pipeline(sync, files: int, size_kb: float, secret_ratio: float, excluded_files: int,
+                   jobs: int, repeat: int) -> list[dict]:
+    tmp = Path(tempfile.mkdtemp(prefix="bench-sync-"))
+    src, target = tmp / "claude", tmp / "target" / "agent-setup"
+    try:
+        count, size = make_sync_tree(src, files, size_kb, secret_ratio, excluded_files)
+        # Sync state goes next to the scratch target, like it does next to the real one
+        engine = sync.SyncEngine(source_root=tmp, target_repo=target, sync_map={"claude": "synced"})
+        dst = target / "synced"
+        print(f"\nPipeline: {count} files ({size / 1e6:.1f} MB), secrets in {secret_ratio:.0%}, "
+              f"{excluded_files} excluded, jobs={jobs}, best of {repeat}")
+
+        def reset():
+            shutil.rmtree(target.parent, ignore_errors=True)
+            target.mkdir(parents=True)
+
+        def run(full: bool = False) -> None:
+            stats = engine.apply(full=full, jobs=jobs)
+            if stats.files_skipped:
+                print(f"  WARNING: {stats.files_skipped} file(s) failed")
+
+        rows = []
+        cold = best_of(repeat, run, setup=reset)
+        rows.append(result("sync_directory/cold", cold, count, size))
+        warm = best_of(repeat, run)
+        rows.append(result("sync_directory/warm", warm, count, size))
+        full = best_of(repeat, run, True)
+        rows.append(result("sync_directory/warm-full", full, count, size))
+
+        # sync_file on the largest text file: cold (no destination) and warm (manifest hit)
+        text_files = [p for p in sync.walk_files(src) if p.suffix in sync.TEXT_SUFFIXES]
+        largest = max(text_files, key=lambda p: p.stat().st_size)
+        largest_dst = dst / largest.relative_to(src)
+        largest_size = largest.stat().st_size
+        manifest = engine.load_manifest()
+
+        def drop_dst():
+            largest_dst.unlink(missing_ok=True)
+
+        rows.append(result("sync_file/cold", best_of(
+            repeat, lambda: engine.sync_file(largest, largest_dst, sync.SyncStats()), setup=drop_dst),
+            1, largest_size))
+        engine.sync_file(largest, largest_dst, sync.SyncStats(), manifest=manifest)
+        rows.append(result("sync_file/warm", best_of(
+            repeat, lambda: engine.sync_file(largest, largest_dst, sync.SyncStats(), manifest=manifest)),
+            1, largest_size))
+
+        # Scanner entry points on all text content at once
+        content = "".join(p.read_text(encoding="utf-8", errors="replace") for p in text_files)
+        text_size = len(content.encode("utf-8"))
+        rows.append(result("sanitize_api_keys", best_of(repeat, engine.scanner.sanitize_api_keys, content),
+                           len(text_files), text_size))
+        rows.append(result("check_sensitive_content",
+                           best_of(repeat, engine.scanner.check_sensitive, content, src),
+                           len(text_files), text_size))
+
+        print(f"  {'benchmark':<28} {'time':>10} {'MB/s':>8}")
+        for row in rows:
+            print(f"  {row['bench']:<28} {row['seconds'] * 1000:>8.2f}ms {row.get('mb_per_s', 0):>8.1f}")
+        return rows
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync-agent-setup.py")
+    parser.add_argument("files", nargs="*", type=Path,
+                        help="Text files to scan (default: the largest markdown commands)")
+    parser.add_argument("--scale", type=int, default=20, help="Repeat each file's content N times")
+    parser.add_argument("--repeat", type=int, default=5, help="Take the best of N runs")
+    parser.add_argument("--only", choices=["scanner", "walk", "pipeline"], help="Run a single benchmark")
+    parser.add_argument("--walk-root", type=Path, help="Walk this tree instead of a synthetic one")
+    parser.add_argument("--walk-files", type=int, default=2000, help="Synced files in the synthetic tree")
+    parser.add_argument("--walk-excluded", type=int, default=20000,
+                        help="Files under excluded directories in the synthetic tree")
+    parser.add_argument("--tree-files", type=int, default=1000, help="Synced files in the pipeline tree")
+    parser.add_argument("--tree-size-kb", type=float, default=8.0, help="Mean file size in the pipeline tree")
+    parser.add_argument("--tree-secrets", type=float, default=0.1,
+                        help="Share of pipeline files containing secrets (0-1)")
+    parser.add_argument("--tree-excluded", type=int, default=5000,
+                        help="Files under excluded directories in the pipeline tree")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Workers for the pipeline sync_directory runs")
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    sync = load_sync_module()
+    rows = []
+    if args.only in (None, "scanner"):
+        files = args.files or sorted(COMMANDS_DIR.glob("*.md"), key=lambda p: p.stat().st_size, reverse=True)[:8]
+        rows += bench_scanner(sync, files, args.scale, args.repeat)
+    if args.only in (None, "walk"):
+        rows += bench_walk(sync, args.walk_root, args.walk_files, args.walk_excluded, args.repeat)
+    if args.only in (None, "pipeline"):
+        rows += bench_pipeline(sync, args.tree_files, args.tree_size_kb, args.tree_secrets,
+                               args.tree_excluded, args.jobs, args.repeat)
+
+    if args.json:
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items() if k != "files"},
+            "results": rows,
+        }
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,37 @@ Excludes sensitive data, scans for secrets, creates sanitized examples.
 """
 
 import argparse
+import ctypes
+import ctypes.util
+import errno
 import hashlib
+import io
 import json
+import multiprocessing
 import os
 import re
+import select
 import shutil
+import struct
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stdout
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
+
+try:
+    import fcntl  # reflink clones (Linux only) and the state lock
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt  # state lock on Windows
+except ImportError:
+    msvcrt = None
 
 # Configuration
 HOME = Path(os.environ.get("USERPROFILE", os.environ.get("HOME", "")))
@@ -21,6 +43,38 @@ SOURCE_ROOT = HOME
 CLAUDE_DIR = HOME / ".claude"
 TARGET_REPO = Path("D:/Code Projects/agent-setup")
 
+# Sync state lives next to the target repo so it never gets committed
+STATE_DIR = TARGET_REPO.parent / f".{TARGET_REPO.name}-sync"
+MANIFEST_FILE = STATE_DIR / "manifest.json"
+DST_INDEX_FILE = STATE_DIR / "dst-index.json"
+STAGING_DIR = STATE_DIR / "staging"
+JOURNAL_FILE = STATE_DIR / "journal.json"
+GIT_STATE_FILE = STATE_DIR / "git-state.json"
+LOCK_FILE = STATE_DIR / "sync.lock"
+TRASH_DIR = STATE_DIR / "trash"
+OBJECTS_DIR = STATE_DIR / "objects"
+MANIFEST_VERSION = 1
+
+# Text files at least this large are sanitized in a worker process when --jobs > 1;
+# smaller ones are cheaper to handle in the I/O thread than to pickle across
+PROCESS_POOL_MIN_BYTES = 64 * 1024
+
+# Text files are sanitized and copied with these suffixes; everything else is binary
+TEXT_SUFFIXES = {".md", ".json", ".py", ".ps1", ".sh", ".txt", ".yaml", ".yml", ".toml"}
+
+# Text files at least this large are sanitized in chunks so memory stays bounded
+STREAM_THRESHOLD = 8 * 1024 * 1024
+STREAM_CHUNK_CHARS = 1024 * 1024
+# Context kept past each chunk boundary so a match crossing it is seen whole.
+# Far above the longest pattern's minimum match (~130 chars for sk-proj keys)
+STREAM_OVERLAP = 4096
+# Hard cap on buffered text while waiting for a single huge match to end
+STREAM_MAX_BUFFER = 4 * STREAM_CHUNK_CHARS
+
+# Watch mode
+WATCH_DEBOUNCE = 0.5  # seconds of quiet before a burst of events is synced
+WATCH_POLL_INTERVAL = 1.0  # seconds between scans for the polling watcher
+
 # What to sync
 SYNC_MAP = {
     # Source -> Destination (relative to respective roots)
@@ -157,309 +211,2322 @@ API_KEY_SANITIZE = [
     (r"ELEVENLABS_API_KEY=[a-zA-Z0-9]{32}", r"ELEVENLABS_API_KEY=${ELEVENLABS_API_KEY}"),
 ]
 
+# Published in place of ~/.codex/config.toml, which holds local paths and trust settings
+CODEX_CONFIG_EXAMPLE = '''# Codex CLI Configuration Example
+# Copy to ~/.codex/config.toml and customize
+
+model = "gpt-5.2-codex"
+model_reasoning_effort = "medium"
+windows_wsl_setup_acknowledged = true
+
+# Trust your project directories
+# [projects.'C:\\Path\\To\\Project']
+# trust_level = "trusted"
+
+[notice]
+hide_gpt5_1_migration_prompt = true
+"hide_gpt-5.1-codex-max_migration_prompt" = true
+
+[notice.model_migrations]
+"gpt-5.2" = "gpt-5.2-codex"
+
+[features]
+unified_exec = true
+shell_snapshot = true
+powershell_utf8 = true
+collab = true
+steer = true
+'''
+
 
 class SyncStats:
     def __init__(self):
         self.files_copied = 0
         self.files_skipped = 0
         self.files_unchanged = 0
+        self.files_deleted = 0
         self.dirs_created = 0
         self.warnings = []
         self.changes = []
+        self.files = []  # per-file records for --report json
+        self.roots = []  # per-SYNC_MAP-root timing
+        self.unwalked: list[Path] = []  # destinations whose source could not be fully read; never pruned
+        self.timings: dict[str, float] = {}  # seconds spent per phase
+
+    def merge(self, other: "SyncStats") -> None:
+        """Fold another SyncStats (e.g. from a worker) into this one."""
+        self.files_copied += other.files_copied
+        self.files_skipped += other.files_skipped
+        self.files_unchanged += other.files_unchanged
+        self.files_deleted += other.files_deleted
+        self.dirs_created += other.dirs_created
+        self.warnings.extend(other.warnings)
+        self.changes.extend(other.changes)
+        self.files.extend(other.files)
+        self.roots.extend(other.roots)
+        self.unwalked.extend(other.unwalked)
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the time spent in the block to the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def file_record(self, src: Optional[Path], dst: Path) -> dict:
+        """Start the report record for one file; callers fill in the outcome."""
+        record = {"src": str(src) if src is not None else None, "dst": str(dst), "action": "skipped", "bytes_read": 0,
+                  "bytes_written": 0, "keys_sanitized": 0, "warnings": 0}
+        self.files.append(record)
+        return record
+
+
+class WorkerPools:
+    """Thread pool for per-file I/O plus a process pool for CPU-heavy sanitization."""
+
+    def __init__(self, jobs: int):
+        # Fork every worker process up front, before any I/O thread exists: forking
+        # a multi-threaded process can leave a lock held forever in the child.
+        # With an explicit fork context the first task launches the whole pool.
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        self.cpu = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork") if fork else None)
+        self.cpu.submit(int).result()
+        self.io = ThreadPoolExecutor(max_workers=jobs)
+
+    def sanitize(self, content: str, src: Path, scanner: Optional["SecretScanner"] = None) -> tuple[str, int, list[str]]:
+        """Sanitize in a worker process if the file is big enough to be worth it.
+
+        A non-default scanner is pickled along with the task; workers start
+        with the module's SCANNER already compiled.
+        """
+        if scanner is SCANNER:
+            scanner = None
+        if len(content) < PROCESS_POOL_MIN_BYTES:
+            return sanitize_content(content, src, scanner)
+        return self.cpu.submit(sanitize_content, content, src, scanner).result()
+
+    def shutdown(self) -> None:
+        self.io.shutdown()
+        self.cpu.shutdown()
+
+
+class WriteTransaction:
+    """Stages changed outputs and swaps them into the target in one bulk step.
+
+    Outputs are written under STAGING_DIR, which sits next to the target repo
+    (same filesystem, so renames are atomic). commit() fsyncs the staged files
+    and the staging directory, journals the pending renames, renames everything
+    into place, fsyncs each touched target directory once and drops the journal.
+    A crash before the journal is written leaves the target untouched; a crash
+    after it is rolled forward by recover() on the next run, so no target file
+    is ever half-written.
+
+    A direct transaction (staging_dir=None) writes straight to the target.
+    """
+
+    def __init__(self, staging_dir: Optional[Path] = None, journal_file: Optional[Path] = None):
+        self.staging_dir = staging_dir
+        self.journal_file = journal_file
+        self.staged: list[tuple[Path, Path]] = []  # (staged path, dst)
+        self.on_commit: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    @classmethod
+    def direct(cls) -> "WriteTransaction":
+        return cls()
+
+    def _stage_path(self, dst: Path) -> Optional[Path]:
+        """Reserve a staging path for dst (None in direct mode)."""
+        if self.staging_dir is None:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            return None
+        with self._lock:
+            self._counter += 1
+            staged = self.staging_dir / f"{self._counter:06d}-{dst.name}"
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        return staged
+
+    def _add(self, staged: Optional[Path], dst: Path, on_commit: Optional[Callable[[], None]]) -> None:
+        if staged is None:
+            if on_commit is not None:
+                on_commit()
+            return
+        with self._lock:
+            self.staged.append((staged, dst))
+            if on_commit is not None:
+                self.on_commit.append(on_commit)
+
+    def temp_dir(self, dst: Path) -> Path:
+        """Directory for a temp file that will later be handed to stage_file()."""
+        if self.staging_dir is None:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            return dst.parent
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        return self.staging_dir
+
+    def stage_bytes(self, dst: Path, data: bytes, on_commit: Optional[Callable[[], None]] = None) -> None:
+        """Write data to dst as part of the transaction; on_commit runs once it is in place."""
+        staged = self._stage_path(dst)
+        (staged or dst).write_bytes(data)
+        self._add(staged, dst, on_commit)
+
+    def stage_copy(self, src: Path, dst: Path, on_commit: Optional[Callable[[], None]] = None,
+                   meta_src: Optional[Path] = None) -> Path:
+        """Copy src to dst as part of the transaction, with the metadata of meta_src (default src).
+
+        Returns the path written (the staged file, or dst in direct mode).
+        """
+        staged = self._stage_path(dst)
+        fast_copy(src, staged or dst)
+        shutil.copystat(meta_src or src, staged or dst)
+        self._add(staged, dst, on_commit)
+        return staged or dst
+
+    def stage_file(self, tmp: Path, dst: Path, on_commit: Optional[Callable[[], None]] = None) -> None:
+        """Take over a finished temp file (created in temp_dir()) as the new dst."""
+        if self.staging_dir is None:
+            os.replace(tmp, dst)
+            self._add(None, dst, on_commit)
+        else:
+            self._add(tmp, dst, on_commit)
+
+    def stage_delete(self, dst: Path, trash: Optional[Path] = None,
+                     on_commit: Optional[Callable[[], None]] = None) -> None:
+        """Remove dst as part of the transaction, moving it to trash if given.
+
+        Without trash, dst is renamed into the staging directory and disappears
+        with it, so deletions are journaled and rolled forward like writes.
+        """
+        target = trash if trash is not None else self._stage_path(dst)
+        if target is None:
+            dst.unlink(missing_ok=True)
+            self._add(None, dst, on_commit)
+            return
+        with self._lock:
+            self.staged.append((dst, target))
+            if on_commit is not None:
+                self.on_commit.append(on_commit)
+
+    def commit(self) -> int:
+        """Move every staged change into place. Returns the number of files changed."""
+        if not self.staged:
+            return 0
+
+        # Make staged data durable: files, then their directory once
+        for staged, _ in self.staged:
+            if self.staging_dir in staged.parents:
+                _fsync_path(staged)
+        _fsync_dir(self.staging_dir)
+
+        _write_journal(self.journal_file, self.staged)
+        _apply_renames(self.staged)
+        self.journal_file.unlink(missing_ok=True)
+        # Drop deleted files that were parked in staging
+        if self.staging_dir.exists():
+            for entry in os.scandir(self.staging_dir):
+                if entry.is_file(follow_symlinks=False):
+                    os.unlink(entry.path)
+
+        for callback in self.on_commit:
+            callback()
+        count = len(self.staged)
+        self.staged.clear()
+        self.on_commit.clear()
+        return count
+
+    def abort(self) -> None:
+        """Throw away everything staged so far (pending deletions are dropped, not applied)."""
+        for staged, _ in self.staged:
+            if self.staging_dir in staged.parents:
+                staged.unlink(missing_ok=True)
+        self.staged.clear()
+        self.on_commit.clear()
+
+    @staticmethod
+    def recover(staging_dir: Path, journal_file: Path) -> int:
+        """Roll forward a commit interrupted after its journal was written.
+
+        Returns the number of files moved into place. Leftover staged files
+        without a journal belong to a run that never committed and are removed.
+        """
+        moved = 0
+        try:
+            pending = json.loads(journal_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pending = []
+        renames = [(Path(staged), Path(dst)) for staged, dst in pending if Path(staged).exists()]
+        if renames:
+            _apply_renames(renames)
+            moved = len(renames)
+        journal_file.unlink(missing_ok=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return moved
+
+
+class StateLock:
+    """Exclusive lock on the state directory, held for a whole run and its commit.
+
+    Syncs sharing STATE_DIR (a /sync run while --watch is active) would
+    otherwise clear each other's staging area in recover() and overwrite each
+    other's manifest. The lock is an flock (LockFileEx on Windows) on
+    LOCK_FILE, so it is released even when the holder is killed. on_wait is
+    called once if another process holds the lock.
+    """
+
+    def __init__(self, path: Path, on_wait: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.on_wait = on_wait
+        self._file = None
+
+    def _try_lock(self, blocking: bool) -> bool:
+        fd = self._file.fileno()
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            elif msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if blocking and fcntl is not None:
+                raise
+            return False  # held elsewhere (LK_LOCK also gives up after ~10s; the caller retries)
+        return True
 
+    def __enter__(self) -> "StateLock":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        if not self._try_lock(blocking=False):
+            if self.on_wait is not None:
+                self.on_wait()
+            while not self._try_lock(blocking=True):
+                pass
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def _fsync_path(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
-def should_exclude(path: Path) -> bool:
-    """Check if path should be excluded from sync."""
-    path_str = str(path)
-    name = path.name
 
-    for pattern in EXCLUDE_PATTERNS:
-        if pattern in path_str or name == pattern or name.endswith(pattern):
-            return True
+def _fsync_dir(directory: Path) -> None:
+    """fsync a directory so renames in it are durable (not supported on Windows)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_journal(journal_file: Path, renames: list[tuple[Path, Path]]) -> None:
+    tmp = journal_file.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump([[str(staged), str(dst)] for staged, dst in renames], f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, journal_file)
+    _fsync_dir(journal_file.parent)
+
+
+def _apply_renames(renames: list[tuple[Path, Path]]) -> None:
+    """Rename staged files over their destinations, then fsync each touched directory once."""
+    touched = set()
+    # Renames out of a directory (deletions) must be durable too
+    touched.update(staged.parent for staged, _ in renames)
+    for staged, dst in renames:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(staged, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(staged, dst)  # staging ended up on another filesystem
+        touched.add(dst.parent)
+    for directory in sorted(touched):
+        _fsync_dir(directory)
+
+
+class _StateFile:
+    """JSON-backed dict of entries kept in STATE_DIR between runs."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.version: object = MANIFEST_VERSION
+        self.entries: dict[str, dict] = {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path, **kwargs):
+        """Load from disk, starting empty if missing or outdated."""
+        state = cls(path, **kwargs)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return state
+        if data.get("version") == state.version:
+            state.entries = data.get("files", {})
+        return state
+
+    def save(self) -> None:
+        """Write atomically (only if something changed)."""
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"version": self.version, "files": self.entries}, separators=(",", ":")),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+class DestinationIndex(_StateFile):
+    """Sidecar index of the digest sync last wrote (or verified) for each destination.
+
+    Maps destination path -> size, mtime_ns and BLAKE2b digest of its bytes, so
+    a destination whose stat() still matches never has to be read to compare.
+    """
+
+    def forget(self, dst: Path) -> None:
+        if self.entries.pop(str(dst), None) is not None:
+            self.dirty = True
+
+    def record(self, dst: Path, digest: str) -> None:
+        st = dst.stat()
+        self.entries[str(dst)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": digest}
+        self.dirty = True
+
+    def holds(self, dst: Path, digest: str) -> bool:
+        """Check with one stat() that dst is still exactly what sync recorded as digest."""
+        entry = self.entries.get(str(dst))
+        if not entry or entry["digest"] != digest:
+            return False
+        try:
+            st = dst.stat()
+        except OSError:
+            return False
+        return entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+
+    def matches(self, dst: Path, size: int, digest: str) -> bool:
+        """Check whether dst already holds exactly these bytes.
+
+        One stat() when dst is as sync left it; a size mismatch ends the check
+        before any read; otherwise dst is hashed once and remembered.
+        """
+        try:
+            st = dst.stat()
+        except FileNotFoundError:
+            return False
+        if st.st_size != size:
+            return False
+
+        entry = self.entries.get(str(dst))
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["digest"] == digest
+
+        # Unknown or touched outside sync - hash it once
+        dst_hash = get_file_hash(dst)
+        self.entries[str(dst)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": dst_hash}
+        self.dirty = True
+        return dst_hash == digest
+
+
+class SyncManifest(_StateFile):
+    """Persistent record of every synced source file.
+
+    Maps source path -> size, mtime_ns, source hash and sanitized-output hash,
+    so a file whose stat() is unchanged since the last sync can be skipped
+    without reading, sanitizing or comparing it again. Carries the
+    DestinationIndex used to compare outputs without reading destinations.
+    The version includes the digest of the sanitization tables, so editing a
+    pattern invalidates every recorded output.
+    """
+
+    def __init__(self, path: Path, targets: Optional[DestinationIndex] = None, patterns: Optional[str] = None):
+        super().__init__(path)
+        self.version = f"{MANIFEST_VERSION}:{patterns if patterns is not None else SCANNER.digest}"
+        self.seen: set[str] = set()
+        self.targets = targets if targets is not None else DestinationIndex(DST_INDEX_FILE)
+        self.git: Optional[GitState] = None  # set to ask git for changed files (--git)
+
+    def lookup(self, src: Path, st: os.stat_result, dst: Path) -> Optional[dict]:
+        """Return the entry for src if neither it nor dst changed since it was recorded."""
+        key = str(src)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if (
+            entry
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+            and entry["dst"] == str(dst)
+            and self.targets.holds(dst, entry["out_hash"])
+        ):
+            return entry
+        return None
 
-    # Exclude retired folders
-    if "retired" in path.parts:
+    def get(self, src: Path) -> Optional[dict]:
+        return self.entries.get(str(src))
+
+    def record(self, src: Path, st: os.stat_result, dst: Path, src_hash: str,
+               out_hash: str, warnings: list[str]) -> None:
+        """Remember the state of src after its output was written to dst."""
+        key = str(src)
+        self.seen.add(key)
+        self.entries[key] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "dst": str(dst),
+            "src_hash": src_hash,
+            "out_hash": out_hash,
+            "warnings": warnings,
+        }
+        self.dirty = True
+
+    def prune_unseen(self) -> None:
+        """Drop entries for sources that no longer exist or are now excluded."""
+        stale = self.entries.keys() - self.seen
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self.dirty = True
+
+    def live_destinations(self) -> set[str]:
+        """Destinations of the sources visited this run."""
+        return {self.entries[key]["dst"] for key in self.seen if key in self.entries}
+
+    def has_entries_under(self, root: Path) -> bool:
+        """Whether any source below root was recorded (False after a reset or a pattern edit)."""
+        prefix = os.path.join(str(root), "")
+        return any(key.startswith(prefix) for key in self.entries)
+
+    def mark_seen_under(self, root: Path, exclude: set[str]) -> int:
+        """Keep entries below root that were not visited this run. Returns how many."""
+        prefix = os.path.join(str(root), "")
+        kept = [key for key in self.entries if key.startswith(prefix) and key not in exclude]
+        self.seen.update(kept)
+        return len(kept)
+
+    def save(self) -> None:
+        super().save()
+        self.targets.save()
+        if self.git is not None:
+            self.git.save()
+
+
+def run_git(args: list[str], cwd: Path, timeout: int = 30) -> tuple[int, str]:
+    """Run a git command in cwd and return (exit code, stdout)."""
+    try:
+        result = subprocess.run(
+            ["git", *args],
+            cwd=cwd,
+            capture_output=True,
+            encoding="utf-8",
+            errors="surrogateescape",
+            timeout=timeout,
+        )
+        return result.returncode, result.stdout
+    except subprocess.TimeoutExpired:
+        return 1, "Command timed out"
+    except (FileNotFoundError, NotADirectoryError):
+        return -1, "git not found"
+
+
+class GitState(_StateFile):
+    """Where each git-tracked source root stood at the last sync.
+
+    Maps source root -> HEAD commit and the files that were modified or
+    untracked at that point. The next sync only has to visit what
+    `git diff` and `git ls-files` report since then, plus the previous dirty
+    set (a dirty file may since have been reverted). New positions are held
+    as pending until the run's writes are committed, so a dry run or a failed
+    commit never moves a root past changes that did not reach the target.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.pending: dict[str, dict] = {}
+
+    def changed_since(self, root: Path, matcher: "ExcludeMatcher") -> tuple[Optional[list[Path]], Optional[dict]]:
+        """Ask git what changed under root since its recorded commit.
+
+        Returns (candidate files, new entry). Candidates are None when root
+        is not in a git work tree or has no usable recorded state, meaning
+        the caller must walk it; the entry is None when root is not in git.
+        Paths the matcher excludes (an untracked node_modules, say) are
+        dropped before they reach either.
+        """
+        code, head = run_git(["rev-parse", "HEAD"], root)
+        if code != 0:
+            return None, None
+        code, dirty_out = run_git(["ls-files", "-z", "-m", "-o", "--exclude-standard"], root)
+        if code != 0:
+            return None, None
+        dirty = sorted({rel for rel in dirty_out.split("\0") if rel and not matcher.excludes(Path(rel))})
+        entry = {"commit": head.strip(), "dirty": dirty}
+
+        previous = self.entries.get(str(root))
+        if not previous:
+            return None, entry
+        code, diff_out = run_git(
+            ["diff", "-z", "--name-only", "--no-renames", "--relative", previous["commit"], "--", "."], root
+        )
+        if code != 0:
+            return None, entry  # recorded commit no longer exists (rebase, gc)
+
+        changed = {rel for rel in diff_out.split("\0") if rel and not matcher.excludes(Path(rel))}
+        changed |= set(dirty) | set(previous["dirty"])
+        return [root / rel for rel in changed], entry
+
+    def remember(self, root: Path, entry: dict) -> None:
+        """Stage root's new position; advance() makes it the recorded one."""
+        self.pending[str(root)] = entry
+
+    def advance(self) -> None:
+        """Record every staged position (call once the run's writes are committed)."""
+        if self.pending:
+            self.entries.update(self.pending)
+            self.pending.clear()
+            self.dirty = True
+
+
+class ExcludeMatcher:
+    """Compiled form of EXCLUDE_PATTERNS.
+
+    A path component is excluded when it contains any excluded pattern
+    (".env" also catches ".env.local", "settings.local.json" catches its
+    ".bak" copies) or is a retired folder. The patterns are one compiled
+    alternation searched once per name. Only components below the sync root
+    are tested, so the user's own home path can never exclude a whole tree.
+    """
+
+    def __init__(self, patterns: list[str], retired: tuple[str, ...] = ("retired",)):
+        self.retired = frozenset(retired)
+        self.pattern = re.compile("|".join(re.escape(p) for p in patterns)) if patterns else None
+
+    def excludes_name(self, name: str) -> bool:
+        return name in self.retired or (self.pattern is not None and self.pattern.search(name) is not None)
+
+    def excludes(self, rel_path: Path) -> bool:
+        return any(self.excludes_name(part) for part in rel_path.parts)
+
+
+EXCLUDER = ExcludeMatcher(EXCLUDE_PATTERNS)
+
+
+def should_exclude(path: Path) -> bool:
+    """Check if path (relative to its sync root) should be excluded from sync."""
+    return EXCLUDER.excludes(path)
+
+
+def walk_files(root: Path, matcher: ExcludeMatcher = EXCLUDER,
+               unreadable: Optional[list[Path]] = None) -> Iterator[Path]:
+    """Yield files under root in sorted order, pruning excluded directories before descending.
+
+    Like Path.rglob, symlinked directories are not followed. Directories that
+    cannot be listed are skipped and, when given, appended to unreadable.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except PermissionError:
+            if unreadable is not None:
+                unreadable.append(Path(directory))
+            continue
+        except FileNotFoundError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if matcher.excludes_name(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    yield Path(entry.path)
+            except OSError:
+                continue
+        # Files of a directory first, then its subdirectories in name order
+        stack.extend(reversed(subdirs))
+
+
+def walk_order(rel_path: Path) -> tuple:
+    """Sort key that puts relative paths in walk_files() order."""
+    *dirs, name = rel_path.parts
+    return tuple((1, part) for part in dirs) + ((0, name),)
+
+
+def filter_changed(root: Path, paths: list[Path], matcher: ExcludeMatcher = EXCLUDER) -> list[Path]:
+    """Reduce git-reported paths to the files walk_files(root) would yield, in its order.
+
+    `git ls-files -o` reports an untracked nested repository (a cloned skill)
+    as its directory only, so directories are walked for their files.
+    """
+    kept = set()
+    for path in paths:
+        rel = path.relative_to(root)
+        if matcher.excludes(rel) or path.is_symlink() and path.is_dir():
+            continue
+        if path.is_dir():
+            kept.update(item.relative_to(root) for item in walk_files(path, matcher))
+        elif path.is_file():
+            kept.add(rel)
+    return [root / rel for rel in sorted(kept, key=walk_order)]
+
+
+_QUANTIFIER = re.compile(r"\{(\d*)(?:,(\d*))?\}")
+
+
+def _required_literals(pattern: str) -> list[str]:
+    """Extract literal substrings that every match of pattern must contain.
+
+    Only understands the subset of regex syntax used in the pattern tables
+    (literals, escapes, classes, quantifiers). Anything with groups or
+    alternation returns [] so the pattern is always run.
+    """
+    literals = []
+    run = []
+    last_literal = False
+    i, n = 0, len(pattern)
+
+    def flush():
+        if run:
+            literals.append("".join(run))
+            run.clear()
+
+    while i < n:
+        ch = pattern[i]
+        quantifier = _QUANTIFIER.match(pattern, i) if ch == "{" else None
+        if ch in "(|)":
+            return []
+        if ch in "*?+" or quantifier:
+            if quantifier:
+                required = int(quantifier.group(1) or 0) > 0
+                i = quantifier.end()
+            else:
+                required = ch == "+"
+                i += 1
+            if i < n and pattern[i] == "?":  # non-greedy
+                i += 1
+            if last_literal and not required:
+                run.pop()
+            flush()
+            last_literal = False
+            continue
+        if ch == "\\":
+            nxt = pattern[i + 1]
+            i += 2
+            if nxt.isalnum():  # \s, \d, \b, ... are not literals
+                flush()
+                last_literal = False
+            else:
+                run.append(nxt)
+                last_literal = True
+            continue
+        if ch == "[":
+            j = i + 1
+            if j < n and pattern[j] == "^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while pattern[j] != "]":
+                j += 2 if pattern[j] == "\\" else 1
+            i = j + 1
+            flush()
+            last_literal = False
+            continue
+        if ch in ".^$":
+            flush()
+            last_literal = False
+            i += 1
+            continue
+        run.append(ch)
+        last_literal = True
+        i += 1
+    flush()
+    return literals
+
+
+class _Rule:
+    __slots__ = ("pattern", "regex", "literals", "replacement")
+
+    def __init__(self, pattern: str, replacement: Optional[str] = None):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.literals = _required_literals(pattern)
+        self.replacement = replacement
+
+
+class SecretScanner:
+    """Precompiled matcher for the sanitize/scan pattern tables.
+
+    Each pattern is compiled once together with the literal substrings any
+    match must contain ("AIzaSy", "sk-", "ghp_", "fc-", ...). A pattern is only
+    run when all of its literals occur in the text, and every literal is
+    searched at most once per text version, so a file without secrets costs a
+    few fast substring searches instead of ~35 regex passes. Candidate patterns
+    still run in table order, which keeps output byte-identical to applying
+    every pattern in turn.
+    """
+
+    def __init__(self, api_key_rules, path_rules, sensitive_patterns, safe_patterns):
+        # Identifies these tables; outputs recorded under other tables are stale
+        self.digest = hashlib.blake2b(
+            json.dumps([api_key_rules, path_rules, sensitive_patterns, safe_patterns]).encode(), digest_size=8
+        ).hexdigest()
+        self.api_key_rules = [_Rule(p, r) for p, r in api_key_rules]
+        self.path_rules = [_Rule(p, r) for p, r in path_rules]
+        self.sensitive_rules = [_Rule(p) for p in sensitive_patterns]
+        self.safe_rules = [_Rule(p) for p in safe_patterns]
+
+        # A rule also requires every other rule's literal found inside its own
+        # ("GEMINI_API_KEY=AIzaSy" implies "AIzaSy"). Checking the literals
+        # shared by many rules first means one failed search rejects the whole
+        # family of rules built on it
+        rules = self.api_key_rules + self.path_rules + self.sensitive_rules + self.safe_rules
+        all_literals = {literal for rule in rules for literal in rule.literals}
+        shared = {}
+        for rule in rules:
+            rule.literals = {g for g in all_literals if any(g in literal for literal in rule.literals)}
+            for literal in rule.literals:
+                shared[literal] = shared.get(literal, 0) + 1
+        for rule in rules:
+            rule.literals = sorted(rule.literals, key=lambda lit: (-shared[lit], -len(lit), lit))
+
+    @staticmethod
+    def _may_match(rule: _Rule, content: str, present: dict[str, bool]) -> bool:
+        for literal in rule.literals:
+            found = present.get(literal)
+            if found is None:
+                found = present[literal] = literal in content
+            if not found:
+                return False
         return True
 
-    return False
+    def _substitute(self, rules: list[_Rule], content: str, present: dict[str, bool]) -> tuple[str, int]:
+        count = 0
+        for rule in rules:
+            if not self._may_match(rule, content, present):
+                continue
+            new_content, n = rule.regex.subn(rule.replacement, content)
+            if n > 0:
+                count += n
+                content = new_content
+                present.clear()  # literal hits are only valid for the old text
+        return content, count
+
+    def sanitize_api_keys(self, content: str, present: Optional[dict] = None) -> tuple[str, int]:
+        return self._substitute(self.api_key_rules, content, {} if present is None else present)
+
+    def sanitize_paths(self, content: str, present: Optional[dict] = None) -> str:
+        return self._substitute(self.path_rules, content, {} if present is None else present)[0]
+
+    def check_sensitive(self, content: str, filepath: Path, present: Optional[dict] = None) -> list[str]:
+        present = {} if present is None else present
+
+        # First check if this looks like documentation/regex patterns (safe)
+        for rule in self.safe_rules:
+            if self._may_match(rule, content, present) and rule.regex.search(content):
+                # File contains documentation patterns, be more lenient
+                return []
+
+        warnings = []
+        for rule in self.sensitive_rules:
+            if self._may_match(rule, content, present) and rule.regex.search(content):
+                # Don't include the actual sensitive value in warning
+                warnings.append(f"  - Potential sensitive data ({rule.pattern[:25]}...) in {filepath}")
+        return warnings
+
+    def _safe_cut(self, buf: str, cut: int, present: dict[str, bool]) -> int:
+        """Move cut back until no pattern match in buf crosses it."""
+        # Matches almost never span lines, so start from a line boundary
+        newline = buf.rfind("\n", max(0, cut - STREAM_OVERLAP), cut)
+        if newline != -1:
+            cut = newline + 1
+
+        rules = self.api_key_rules + self.path_rules + self.sensitive_rules + self.safe_rules
+        moved = True
+        while moved and cut > 0:
+            moved = False
+            for rule in rules:
+                if not self._may_match(rule, buf, present):
+                    continue
+                for match in rule.regex.finditer(buf):
+                    if match.start() >= cut:
+                        break
+                    if match.end() > cut:
+                        cut = match.start()
+                        moved = True
+                        break
+        return cut
+
+    def scan_stream(self, reader: io.TextIOBase, write, src: Path) -> tuple[int, list[str]]:
+        """Chunked equivalent of scan() for files too big to hold in memory.
+
+        Reads STREAM_CHUNK_CHARS at a time, sanitizes everything up to a cut
+        point that no match crosses, passes the result to write() and carries
+        the rest into the next chunk. The check for sensitive content also
+        carries the unfinished output line, so line-bound SAFE patterns
+        (`api_key.*\$`) see whole lines as scan() does; only a single line
+        longer than STREAM_MAX_BUFFER can give an extra warning.
+        Returns (keys sanitized, warnings).
+        """
+        keys_sanitized = 0
+        safe_seen = False
+        sensitive_hits = set()
+        carry = ""
+        tail = ""
+
+        while True:
+            chunk = reader.read(STREAM_CHUNK_CHARS)
+            buf = carry + chunk
+            present: dict[str, bool] = {}
+            if not chunk:
+                cut = len(buf)
+            else:
+                cut = self._safe_cut(buf, len(buf) - STREAM_OVERLAP, present)
+                if cut <= 0:
+                    if len(buf) < STREAM_MAX_BUFFER:
+                        carry = buf  # a huge match - read on until it ends
+                        continue
+                    cut = len(buf) - STREAM_OVERLAP
+
+            head, carry = buf[:cut], buf[cut:]
+            # A literal missing from buf is missing from head too
+            present = {literal: False for literal, found in present.items() if not found}
+            head, n = self.sanitize_api_keys(head, present)
+            keys_sanitized += n
+            head = self.sanitize_paths(head, present)
+
+            write(head)
+
+            # Track what check_sensitive would find on the whole output,
+            # including matches formed across the previous boundary
+            checked = tail + head
+            # Carry the last STREAM_OVERLAP chars, or the whole unfinished line if longer
+            start = min(checked.rfind("\n") + 1, max(0, len(checked) - STREAM_OVERLAP))
+            tail = checked[max(start, len(checked) - STREAM_MAX_BUFFER):]
+            present = {}
+            if not safe_seen:
+                safe_seen = any(
+                    self._may_match(rule, checked, present) and rule.regex.search(checked)
+                    for rule in self.safe_rules
+                )
+            for i, rule in enumerate(self.sensitive_rules):
+                if i not in sensitive_hits and self._may_match(rule, checked, present) and rule.regex.search(checked):
+                    sensitive_hits.add(i)
+
+            if not chunk:
+                break
+
+        if safe_seen:
+            return keys_sanitized, []
+        warnings = [
+            f"  - Potential sensitive data ({rule.pattern[:25]}...) in {src}"
+            for i, rule in enumerate(self.sensitive_rules)
+            if i in sensitive_hits
+        ]
+        return keys_sanitized, warnings
+
+    def scan(self, content: str, src: Path) -> tuple[str, int, list[str]]:
+        """Sanitize keys and paths, then check what is left, sharing literal lookups."""
+        present: dict[str, bool] = {}
+        content, keys_sanitized = self.sanitize_api_keys(content, present)
+        content = self.sanitize_paths(content, present)
+        return content, keys_sanitized, self.check_sensitive(content, src, present)
+
+
+SCANNER = SecretScanner(API_KEY_SANITIZE, PATH_SANITIZE, SENSITIVE_PATTERNS, SAFE_PATTERNS)
 
 
 def check_sensitive_content(content: str, filepath: Path) -> list[str]:
     """Scan content for sensitive patterns. Returns list of warnings."""
-    warnings = []
-
-    # First check if this looks like documentation/regex patterns (safe)
-    for safe_pattern in SAFE_PATTERNS:
-        if re.search(safe_pattern, content):
-            # File contains documentation patterns, be more lenient
-            return []
-
-    for pattern in SENSITIVE_PATTERNS:
-        matches = re.findall(pattern, content)
-        if matches:
-            # Don't include the actual sensitive value in warning
-            warnings.append(f"  - Potential sensitive data ({pattern[:25]}...) in {filepath}")
-
-    return warnings
+    return SCANNER.check_sensitive(content, filepath)
 
 
 def sanitize_paths(content: str) -> str:
     """Replace user-specific paths with placeholders."""
-    for pattern, replacement in PATH_SANITIZE:
-        content = re.sub(pattern, replacement, content)
-    return content
+    return SCANNER.sanitize_paths(content)
 
 
 def sanitize_api_keys(content: str) -> tuple[str, int]:
     """Replace API keys with environment variable references. Returns (content, count)."""
-    count = 0
-    for pattern, replacement in API_KEY_SANITIZE:
-        new_content, n = re.subn(pattern, replacement, content)
-        if n > 0:
-            count += n
-            content = new_content
-    return content, count
+    return SCANNER.sanitize_api_keys(content)
+
+
+def sanitize_content(content: str, src: Path, scanner: Optional[SecretScanner] = None) -> tuple[str, int, list[str]]:
+    """Run the full sanitization pipeline on one file's text.
+
+    Returns (sanitized content, number of API keys replaced, warnings).
+    """
+    # Sanitize API keys and paths, then check for any remaining sensitive
+    # content we might have missed. Still sync, but warn - the sanitization
+    # should have caught real keys
+    content, keys_sanitized, sensitive = (scanner or SCANNER).scan(content, src)
+
+    warnings = []
+    if keys_sanitized > 0:
+        warnings.append(f"  - Sanitized {keys_sanitized} API key(s) in {src.name}")
+    warnings.extend(sensitive)
+
+    return content, keys_sanitized, warnings
+
+
+def content_hash(data: bytes) -> str:
+    """Hash bytes for change detection."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# Linux ioctl that makes dst share src's extents (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+# Errors meaning "this copy method is not available here", not a real I/O failure
+_COPY_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+                     errno.EBADF, errno.ETXTBSY, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+
+def fast_copy(src: Path, dst: Path) -> None:
+    """Copy file contents without passing them through Python buffers where possible.
+
+    Tries a reflink clone (no data copied at all), then os.copy_file_range and
+    os.sendfile (copied inside the kernel), then a plain buffered copy.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(infd).st_size
+        if size == 0:
+            return
+
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(outfd, FICLONE, infd)
+                return
+            except OSError as e:
+                if e.errno not in _COPY_UNSUPPORTED:
+                    raise
+
+        for kernel_copy in (_copy_file_range, _sendfile):
+            try:
+                if kernel_copy(infd, outfd, size):
+                    return
+            except OSError as e:
+                if e.errno not in _COPY_UNSUPPORTED:
+                    raise
+            # Unsupported: start over with the next method
+            os.lseek(infd, 0, os.SEEK_SET)
+            os.lseek(outfd, 0, os.SEEK_SET)
+            os.ftruncate(outfd, 0)
+
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+
+def _copy_file_range(infd: int, outfd: int, size: int) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(infd, outfd, size - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied == size
+
+
+def _sendfile(infd: int, outfd: int, size: int) -> bool:
+    if not hasattr(os, "sendfile") or not sys.platform.startswith("linux"):
+        return False  # file-to-file sendfile is Linux only
+    copied = 0
+    while copied < size:
+        n = os.sendfile(outfd, infd, copied, size - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied == size
 
 
 def get_file_hash(filepath: Path) -> Optional[str]:
-    """Get MD5 hash of file for change detection."""
+    """Get BLAKE2b hash of file for change detection (read in blocks into one reused buffer)."""
     if not filepath.exists():
         return None
     try:
-        return hashlib.md5(filepath.read_bytes()).hexdigest()
+        hasher = hashlib.blake2b(digest_size=16)
+        buffer = bytearray(1024 * 1024)
+        view = memoryview(buffer)
+        with open(filepath, "rb", buffering=0) as f:
+            while n := f.readinto(buffer):
+                hasher.update(view[:n])
+        return hasher.hexdigest()
     except Exception:
         return None
 
 
-def sync_file(src: Path, dst: Path, stats: SyncStats, dry_run: bool = False) -> None:
-    """Sync a single file with automatic sanitization of sensitive content."""
-    if should_exclude(src):
-        stats.files_skipped += 1
-        return
+class _HashingReader(io.RawIOBase):
+    """Raw reader that hashes bytes as they are read."""
 
-    # Read content
-    try:
-        if src.suffix in [".md", ".json", ".py", ".ps1", ".sh", ".txt", ".yaml", ".yml", ".toml"]:
-            content = src.read_text(encoding="utf-8", errors="replace")
+    def __init__(self, raw, hasher):
+        super().__init__()
+        self._raw = raw
+        self._hasher = hasher
 
-            # Sanitize API keys (replace with env var references)
-            content, keys_sanitized = sanitize_api_keys(content)
-            if keys_sanitized > 0:
-                stats.warnings.append(f"  - Sanitized {keys_sanitized} API key(s) in {src.name}")
+    def readable(self) -> bool:
+        return True
 
-            # Sanitize paths
-            content = sanitize_paths(content)
+    def readinto(self, b) -> int:
+        n = self._raw.readinto(b)
+        if n:
+            self._hasher.update(memoryview(b)[:n])
+        return n
+
+
+def decode_text(data: bytes) -> str:
+    """Decode file bytes the same way Path.read_text does (utf-8, universal newlines)."""
+    text = data.decode("utf-8", errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def encode_text(content: str) -> bytes:
+    """Encode text exactly as Path.write_text would write it (utf-8, platform newlines)."""
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    return content.encode("utf-8")
+
+
+class ObjectStore:
+    """Content-addressed blobs under STATE_DIR/objects, named by their BLAKE2b digest."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def temp_dir(self) -> Path:
+        """Directory for temp files that will be handed to put_file() (same filesystem)."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        return self.root
+
+    def _new_temp(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+        os.close(fd)
+        return Path(tmp_name)
+
+    def put_bytes(self, digest: str, data: bytes) -> Path:
+        path = self.path(digest)
+        if not path.exists():
+            tmp = self._new_temp(path)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return path
+
+    def put_file(self, digest: str, tmp: Path) -> Path:
+        """Move a finished temp file into the store (dropping it if the object exists)."""
+        path = self.path(digest)
+        if path.exists():
+            tmp.unlink(missing_ok=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, path)
+        return path
+
+    def discard(self, digests) -> None:
+        for digest in set(digests):
+            self.path(digest).unlink(missing_ok=True)
+
+
+class SyncPlan:
+    """Outputs computed by a planning (dry) run, saved for a later apply.
+
+    Sanitized text goes into the ObjectStore; binaries are recorded by digest
+    only and copied from their source on apply. Each entry keeps the source
+    size and mtime it was computed from, so apply only has to stat sources.
+    """
+
+    def __init__(self, objects: ObjectStore, source_root: Path, target_repo: Path):
+        self.objects = objects
+        self.source_root = source_root
+        self.target_repo = target_repo
+        self.entries: list[dict] = []
+        self.deletions: list[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, src: Path, st: os.stat_result, dst: Path, src_hash: str, out_hash: str,
+            warnings: list[str], data: Optional[bytes] = None, tmp: Optional[Path] = None,
+            kind: str = "file") -> None:
+        """Record one output: its bytes (data), a finished temp file (tmp), or neither for a plain copy."""
+        if data is not None:
+            self.objects.put_bytes(out_hash, data)
+        elif tmp is not None:
+            self.objects.put_file(out_hash, tmp)
+        entry = {
+            "kind": kind,
+            "src": str(src),
+            "dst": str(dst),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "src_hash": src_hash,
+            "out_hash": out_hash,
+            "warnings": warnings,
+            "object": data is not None or tmp is not None,
+        }
+        with self._lock:
+            self.entries.append(entry)
+
+    def add_example(self, src: Path, dst: Path, data: bytes) -> None:
+        """Record a generated example config (src is the local config it derives from)."""
+        self.add(src, src.stat(), dst, "", content_hash(data), [], data=data, kind="example")
+
+    def add_deletion(self, dst: Path) -> None:
+        with self._lock:
+            self.deletions.append(str(dst))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "version": MANIFEST_VERSION,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "source": str(self.source_root),
+            "target": str(self.target_repo),
+            "entries": sorted(self.entries, key=lambda entry: entry["dst"]),
+            "deletions": sorted(self.deletions),
+        }, indent=1), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path, objects: ObjectStore) -> "SyncPlan":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported plan version in {path}")
+        plan = cls(objects, Path(data["source"]), Path(data["target"]))
+        plan.entries = data["entries"]
+        plan.deletions = data["deletions"]
+        return plan
+
+
+class SyncEngine:
+    """A configured sync of a source tree into a target repo.
+
+    Carries what the module globals provide for the CLI - source root, target
+    repo, SYNC_MAP, state directory, the compiled SecretScanner and
+    ExcludeMatcher - so other tools and tests can run many syncs in one
+    process, reusing compiled patterns and the loaded manifest between runs.
+    Anything not passed falls back to the module configuration.
+
+        engine = SyncEngine(source_root=home, target_repo=repo)
+        preview = engine.plan()
+        stats = engine.apply()
+    """
+
+    def __init__(self, source_root: Optional[Path] = None, target_repo: Optional[Path] = None,
+                 sync_map: Optional[dict[str, str]] = None, state_dir: Optional[Path] = None,
+                 scanner: Optional[SecretScanner] = None, excluder: Optional[ExcludeMatcher] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        self.source_root = Path(source_root) if source_root is not None else SOURCE_ROOT
+        self.home = self.source_root if source_root is not None else HOME
+        self.claude_dir = self.source_root / ".claude" if source_root is not None else CLAUDE_DIR
+        self.target_repo = Path(target_repo) if target_repo is not None else TARGET_REPO
+        self.sync_map = sync_map if sync_map is not None else SYNC_MAP
+        if state_dir is None:
+            # Next to the target repo, like STATE_DIR
+            state_dir = STATE_DIR if target_repo is None else self.target_repo.parent / f".{self.target_repo.name}-sync"
+        self.state_dir = Path(state_dir)
+        self.manifest_file = self.state_dir / MANIFEST_FILE.name
+        self.dst_index_file = self.state_dir / DST_INDEX_FILE.name
+        self.git_state_file = self.state_dir / GIT_STATE_FILE.name
+        self.staging_dir = self.state_dir / STAGING_DIR.name
+        self.journal_file = self.state_dir / JOURNAL_FILE.name
+        self.lock_file = self.state_dir / LOCK_FILE.name
+        self.trash_dir = self.state_dir / TRASH_DIR.name
+        self.objects_dir = self.state_dir / OBJECTS_DIR.name
+        self.scanner = scanner if scanner is not None else SCANNER
+        self.excluder = excluder if excluder is not None else EXCLUDER
+        self.log = log if log is not None else (lambda message: None)
+        self.manifest: Optional[SyncManifest] = None  # kept between runs
+        self._manifest_stamp: Optional[tuple] = None  # state files as this engine last loaded or saved them
+        self.recorder: Optional[SyncPlan] = None  # collects outputs while planning
+        self._blob_digests: dict[tuple, str] = {}  # (dev, inode, size, mtime) -> digest, per run
+        self._copies: dict[str, Path] = {}  # digest -> first copy staged this run
+        self._target_digests: Optional[dict[str, str]] = None  # digest -> a destination holding it
+        self._lock = threading.Lock()
+
+    def sanitize(self, content: str, src: Path) -> tuple[str, int, list[str]]:
+        """Run this engine's sanitization pipeline on one file's text."""
+        return sanitize_content(content, src, self.scanner)
+
+    def locked(self) -> StateLock:
+        """The lock every run that writes to the target holds until its state is saved."""
+        return StateLock(self.lock_file, lambda: self.log(f"Waiting for another sync using {self.state_dir}..."))
+
+    def _state_stamp(self) -> tuple:
+        stamp = []
+        for path in (self.manifest_file, self.dst_index_file, self.git_state_file):
+            try:
+                st = path.stat()
+                stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _save_manifest(self, manifest: SyncManifest) -> None:
+        manifest.save()
+        self._manifest_stamp = self._state_stamp()
+
+    def load_manifest(self, full: bool = False, git: bool = False) -> SyncManifest:
+        """Return the manifest for the next run, reusing the one from the previous run.
+
+        full starts from an empty manifest (destinations are still compared by
+        digest); git attaches the GitState used by --git. The kept manifest is
+        reloaded when another process has saved state since.
+        """
+        if self.manifest is not None and self._manifest_stamp != self._state_stamp():
+            self.manifest = None
+        if full or self.manifest is None:
+            patterns = self.scanner.digest
+            self.manifest = (SyncManifest(self.manifest_file, patterns=patterns) if full
+                             else SyncManifest.load(self.manifest_file, patterns=patterns))
+            self.manifest.targets = DestinationIndex.load(self.dst_index_file)
+            self._manifest_stamp = self._state_stamp()
+        if git and (full or self.manifest.git is None):
+            self.manifest.git = GitState(self.git_state_file) if full else GitState.load(self.git_state_file)
+        elif not git:
+            self.manifest.git = None
+        if self.manifest.git is not None:
+            self.manifest.git.pending.clear()
+        self.manifest.seen.clear()
+        return self.manifest
+
+    def run(self, dry_run: bool = False, full: bool = False, git: bool = False, mirror: bool = False,
+            trash: bool = False, jobs: int = 1, plan_file: Optional[Path] = None) -> SyncStats:
+        """Sync every SYNC_MAP entry and generate the example configs.
+
+        Live runs stage all writes (and --mirror deletions) and commit them in
+        one batch at the end, then save the manifest. A dry run with plan_file
+        also saves every computed output there for apply_plan().
+        """
+        if not self.target_repo.exists():
+            raise FileNotFoundError(f"Target repo not found: {self.target_repo}")
+        if plan_file is not None:
+            if not dry_run:
+                raise ValueError("plan_file is only valid for a dry run")
+            self.recorder = SyncPlan(ObjectStore(self.objects_dir), self.source_root, self.target_repo)
+            try:
+                stats = self.run(dry_run, full, git, mirror, trash, jobs)
+                self.recorder.save(Path(plan_file))
+                return stats
+            finally:
+                self.recorder = None
+
+        with nullcontext() if dry_run else self.locked():
+            return self._run(dry_run, full, git, mirror, trash, jobs)
+
+    def _run(self, dry_run: bool, full: bool, git: bool, mirror: bool, trash: bool, jobs: int) -> SyncStats:
+        """Body of run(); live runs hold the state lock throughout."""
+        stats = SyncStats()
+        self._blob_digests.clear()
+        self._reset_copies()
+        txn = None
+        if not dry_run:
+            # Finish any commit a previous run was interrupted in before reading state
+            recovered = WriteTransaction.recover(self.staging_dir, self.journal_file)
+            if recovered:
+                self.log(f"Recovered {recovered} file(s) from an interrupted sync\n")
+            txn = WriteTransaction(self.staging_dir, self.journal_file)
+
+        manifest = self.load_manifest(full, git)
+
+        pools = WorkerPools(jobs) if jobs > 1 else None
+
+        # Sync each mapped item
+        self.log("Syncing files...")
+        try:
+            for src_rel, dst_rel in self.sync_map.items():
+                src_path = self.source_root / src_rel
+                dst_path = self.target_repo / dst_rel
+
+                self.log(f"  {src_rel} -> {dst_rel}")
+                root_started, files_before = time.perf_counter(), len(stats.files)
+                self.sync_directory(src_path, dst_path, stats, dry_run, manifest, pools, txn)
+                stats.roots.append({
+                    "src": src_rel,
+                    "dst": dst_rel,
+                    "files": len(stats.files) - files_before,
+                    "elapsed": round(time.perf_counter() - root_started, 6),
+                })
+
+            # Create sanitized example files
+            self.log("\nGenerating example configs...")
+            with stats.phase("examples"):
+                self.create_settings_example(stats, dry_run, txn)
+                self.create_codex_config_example(stats, dry_run, txn)
+
+            if mirror:
+                trash_dir = self.trash_dir / datetime.now().strftime("%Y%m%d-%H%M%S") if trash else None
+                self.prune_orphans(manifest, stats, dry_run, txn, trash_dir)
+        except BaseException:
+            if txn is not None:
+                txn.abort()
+            raise
+        finally:
+            if pools is not None:
+                pools.shutdown()
+
+        if txn is not None:
+            # Swap every changed output into place in one batch, then persist state
+            with stats.phase("commit"):
+                txn.commit()
+                remove_empty_dirs([Path(f["dst"]) for f in stats.files if f["action"] == "deleted"], self.target_repo)
+            if manifest.git is not None:
+                manifest.git.advance()
+            manifest.prune_unseen()
+            self._save_manifest(manifest)
+        return stats
+
+    def plan(self, full: bool = False, git: bool = False, mirror: bool = False, jobs: int = 1,
+             plan_file: Optional[Path] = None) -> SyncStats:
+        """Preview a sync: every file's action and the change lines, without writing anything.
+
+        With plan_file, the sanitized outputs are kept so apply(plan_file=...)
+        can write them without sanitizing again.
+        """
+        return self.run(dry_run=True, full=full, git=git, mirror=mirror, jobs=jobs, plan_file=plan_file)
+
+    def apply(self, full: bool = False, git: bool = False, mirror: bool = False, trash: bool = False,
+              jobs: int = 1, plan_file: Optional[Path] = None) -> SyncStats:
+        """Perform a sync, or write exactly the results of a saved plan."""
+        if plan_file is not None:
+            return self.apply_plan(plan_file, trash)
+        return self.run(dry_run=False, full=full, git=git, mirror=mirror, trash=trash, jobs=jobs)
+
+    def apply_plan(self, plan_file: Path, trash: bool = False) -> SyncStats:
+        """Write the outputs recorded by plan(plan_file=...).
+
+        Sources are only re-checked by size and mtime; one that changed since
+        the plan was made is skipped with a warning (plan again to pick it up).
+        """
+        plan = SyncPlan.load(Path(plan_file), ObjectStore(self.objects_dir))
+        if plan.target_repo != self.target_repo:
+            raise ValueError(f"Plan is for {plan.target_repo}, not {self.target_repo}")
+        with self.locked():
+            return self._apply_plan(plan, plan_file, trash)
+
+    def _apply_plan(self, plan: SyncPlan, plan_file: Path, trash: bool) -> SyncStats:
+        """Body of apply_plan(), run under the state lock."""
+        stats = SyncStats()
+        recovered = WriteTransaction.recover(self.staging_dir, self.journal_file)
+        if recovered:
+            self.log(f"Recovered {recovered} file(s) from an interrupted sync\n")
+        self.log(f"Applying plan {plan_file} ({len(plan.entries)} write(s), {len(plan.deletions)} deletion(s))...")
+        txn = WriteTransaction(self.staging_dir, self.journal_file)
+        manifest = self.load_manifest()
+        targets = manifest.targets
+        trash_dir = self.trash_dir / datetime.now().strftime("%Y%m%d-%H%M%S") if trash else None
+
+        try:
+            with stats.phase("write"):
+                for entry in plan.entries:
+                    src, dst = Path(entry["src"]), Path(entry["dst"])
+                    record = stats.file_record(src, dst)
+                    try:
+                        st = src.stat()
+                    except OSError:
+                        st = None
+                    if st is None or (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+                        stats.files_skipped += 1
+                        stats.warnings.append(f"  - Changed since the plan was made, not applied: {src}")
+                        continue
+                    source = plan.objects.path(entry["out_hash"]) if entry["object"] else src
+                    if not source.exists():
+                        stats.files_skipped += 1
+                        stats.warnings.append(f"  - Planned output missing, not applied: {dst}")
+                        continue
+
+                    def applied(src=src, st=st, dst=dst, entry=entry):
+                        if entry["kind"] == "file":
+                            targets.record(dst, entry["out_hash"])
+                            manifest.record(src, st, dst, entry["src_hash"], entry["out_hash"], entry["warnings"])
+
+                    status = "Updated" if dst.exists() else "Added"
+                    txn.stage_copy(source, dst, applied)
+                    record.update(action=status.lower(), bytes_written=source.stat().st_size)
+                    stats.files_copied += 1
+                    label = "Generated" if entry["kind"] == "example" else status
+                    stats.changes.append(f"  {label}: {dst.relative_to(self.target_repo)}")
+
+                for key in plan.deletions:
+                    dst = Path(key)
+                    if key not in targets.entries or not dst.is_file():
+                        continue  # already gone, or no longer a file sync wrote
+                    rel = dst.relative_to(self.target_repo)
+                    txn.stage_delete(dst, trash_dir / rel if trash_dir is not None else None,
+                                     lambda dst=dst: targets.forget(dst))
+                    stats.file_record(None, dst)["action"] = "deleted"
+                    stats.files_deleted += 1
+                    stats.changes.append(f"  Deleted: {rel}")
+        except BaseException:
+            txn.abort()
+            raise
+
+        with stats.phase("commit"):
+            txn.commit()
+            remove_empty_dirs([Path(f["dst"]) for f in stats.files if f["action"] == "deleted"], self.target_repo)
+        self._save_manifest(manifest)
+        plan.objects.discard(entry["out_hash"] for entry in plan.entries if entry["object"])
+        return stats
+
+    def sync_file(self, src: Path, dst: Path, stats: SyncStats, dry_run: bool = False,
+                  manifest: Optional[SyncManifest] = None, pools: Optional[WorkerPools] = None,
+                  txn: Optional[WriteTransaction] = None) -> None:
+        """Sync a single file with automatic sanitization of sensitive content."""
+        record = stats.file_record(src, dst)
+        txn = txn if txn is not None else WriteTransaction.direct()
+        if self.excluder.excludes_name(src.name):
+            stats.files_skipped += 1
+            return
+
+        # Read content
+        try:
+            # Skip files that have not been touched since the last recorded sync
+            with stats.phase("read"):
+                st = src.stat()
+                entry = manifest.lookup(src, st, dst) if manifest is not None else None
+            if entry is not None:
+                record["action"] = "unchanged"
+                stats.files_unchanged += 1
+                stats.warnings.extend(entry["warnings"])
+                return
 
-            # Check for any remaining sensitive content we might have missed
-            warnings = check_sensitive_content(content, src)
-            if warnings:
-                stats.warnings.extend(warnings)
-                # Still sync, but warn - the sanitization should have caught real keys
+            if src.suffix in TEXT_SUFFIXES and st.st_size >= STREAM_THRESHOLD:
+                self.sync_large_text_file(src, dst, st, stats, dry_run, manifest, record, txn)
+                return
 
-            # Check if file changed
-            if dst.exists():
-                existing = dst.read_text(encoding="utf-8", errors="replace")
-                if existing == content:
-                    stats.files_unchanged += 1
-                    return
+            if src.suffix not in TEXT_SUFFIXES:
+                self.sync_binary_file(src, dst, st, stats, dry_run, manifest, record, txn)
+                return
 
-            if not dry_run:
-                dst.parent.mkdir(parents=True, exist_ok=True)
-                dst.write_text(content, encoding="utf-8")
+            # Compare outputs by digest rather than re-reading destinations
+            targets = manifest.targets if manifest is not None else DestinationIndex(self.dst_index_file)
+
+            with stats.phase("read"):
+                data = src.read_bytes()
+                src_hash = content_hash(data)
+            record["bytes_read"] = len(data)
+
+            # Touched but identical content - just refresh the recorded stat
+            entry = manifest.get(src) if manifest is not None else None
+            if (entry is not None and entry["src_hash"] == src_hash and entry["dst"] == str(dst)
+                    and targets.holds(dst, entry["out_hash"])):
+                if not dry_run:
+                    manifest.record(src, st, dst, src_hash, entry["out_hash"], entry["warnings"])
+                record["action"] = "unchanged"
+                stats.files_unchanged += 1
+                stats.warnings.extend(entry["warnings"])
+                return
 
-            stats.files_copied += 1
-            status = "Updated" if dst.exists() else "Added"
-            sanitize_note = f" (sanitized)" if keys_sanitized > 0 else ""
-            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}{status}: {dst.relative_to(TARGET_REPO)}{sanitize_note}")
-        else:
-            # Binary file - just copy
-            src_hash = get_file_hash(src)
-            dst_hash = get_file_hash(dst)
+            with stats.phase("sanitize"):
+                content = decode_text(data)
+                if pools is not None:
+                    content, keys_sanitized, file_warnings = pools.sanitize(content, src, self.scanner)
+                else:
+                    content, keys_sanitized, file_warnings = self.sanitize(content, src)
+                out_data = encode_text(content)
+            stats.warnings.extend(file_warnings)
+            record["keys_sanitized"] = keys_sanitized
+            record["warnings"] = len(file_warnings)
 
-            if src_hash == dst_hash:
+            # Check if file changed
+            with stats.phase("compare"):
+                out_hash = content_hash(out_data)
+                unchanged = targets.matches(dst, len(out_data), out_hash)
+            if unchanged:
+                if manifest is not None and not dry_run:
+                    manifest.record(src, st, dst, src_hash, out_hash, file_warnings)
+                record["action"] = "unchanged"
                 stats.files_unchanged += 1
                 return
 
+            status = "Updated" if dst.exists() else "Added"
             if not dry_run:
-                dst.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(src, dst)
-
+                def written():
+                    targets.record(dst, out_hash)
+                    if manifest is not None:
+                        manifest.record(src, st, dst, src_hash, out_hash, file_warnings)
+
+                with stats.phase("write"):
+                    txn.stage_bytes(dst, out_data, written)
+                record["bytes_written"] = len(out_data)
+            elif self.recorder is not None:
+                self.recorder.add(src, st, dst, src_hash, out_hash, file_warnings, data=out_data)
+
+            record["action"] = status.lower()
             stats.files_copied += 1
-            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}{'Updated' if dst.exists() else 'Added'}: {dst.relative_to(TARGET_REPO)}")
+            sanitize_note = f" (sanitized)" if keys_sanitized > 0 else ""
+            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}{status}: {dst.relative_to(self.target_repo)}{sanitize_note}")
+
+        except Exception as e:
+            record["action"] = "error"
+            stats.warnings.append(f"  - Error processing {src}: {e}")
+            stats.files_skipped += 1
+
+    def sync_binary_file(self, src: Path, dst: Path, st: os.stat_result, stats: SyncStats, dry_run: bool = False,
+                         manifest: Optional[SyncManifest] = None, record: Optional[dict] = None,
+                         txn: Optional[WriteTransaction] = None) -> None:
+        """Copy a binary file, comparing by digest so unchanged content is never copied.
+
+        The source is hashed in blocks (once per inode per run, so a file
+        reachable from several SYNC_MAP roots is read once). If dst does not
+        already hold it, it is cloned from a copy of the same content already
+        staged this run or present in the target (a reflink on the target's
+        filesystem), and only copied from the source when there is none.
+        """
+        record = record if record is not None else stats.file_record(src, dst)
+        txn = txn if txn is not None else WriteTransaction.direct()
+        targets = manifest.targets if manifest is not None else DestinationIndex(self.dst_index_file)
+
+        with stats.phase("read"):
+            src_hash = self.blob_digest(src, st)
+        record["bytes_read"] = st.st_size
+
+        with stats.phase("compare"):
+            unchanged = targets.matches(dst, st.st_size, src_hash)
+        if unchanged:
+            if manifest is not None and not dry_run:
+                manifest.record(src, st, dst, src_hash, src_hash, [])
+            record["action"] = "unchanged"
+            stats.files_unchanged += 1
+            return
+
+        status = "Updated" if dst.exists() else "Added"
+        if not dry_run:
+            def copied():
+                targets.record(dst, src_hash)
+                if manifest is not None:
+                    manifest.record(src, st, dst, src_hash, src_hash, [])
+
+            with stats.phase("write"):
+                written = txn.stage_copy(self.copy_source(src_hash, targets) or src, dst, copied, meta_src=src)
+                with self._lock:
+                    self._copies.setdefault(src_hash, written)
+            record["bytes_written"] = st.st_size
+        elif self.recorder is not None:
+            self.recorder.add(src, st, dst, src_hash, src_hash, [])  # copied from src on apply
+
+        record["action"] = status.lower()
+        stats.files_copied += 1
+        stats.changes.append(f"  {'[DRY] ' if dry_run else ''}{status}: {dst.relative_to(self.target_repo)}")
+
+    def _reset_copies(self) -> None:
+        """Forget copies from an earlier run or batch (their staged files are gone)."""
+        with self._lock:
+            self._copies.clear()
+            self._target_digests = None
+
+    def copy_source(self, digest: str, targets: DestinationIndex) -> Optional[Path]:
+        """A file already holding digest to clone from: staged this run, or in the target."""
+        with self._lock:
+            staged = self._copies.get(digest)
+            if self._target_digests is None:
+                self._target_digests = {}
+                for key, entry in list(targets.entries.items()):
+                    self._target_digests.setdefault(entry["digest"], key)
+            held = self._target_digests.get(digest)
+        if staged is not None and staged.exists():
+            return staged
+        if held is not None and targets.holds(Path(held), digest):
+            return Path(held)
+        return None
 
-    except Exception as e:
-        stats.warnings.append(f"  - Error processing {src}: {e}")
-        stats.files_skipped += 1
+    def blob_digest(self, src: Path, st: os.stat_result) -> str:
+        """Digest of a binary source, hashed at most once per inode during a run."""
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._blob_digests.get(key) if st.st_ino else None
+        if digest is None:
+            digest = get_file_hash(src)
+            if digest is None:
+                raise OSError(f"Cannot read {src}")
+            with self._lock:
+                self._blob_digests[key] = digest
+        return digest
+
+    def sync_large_text_file(self, src: Path, dst: Path, st: os.stat_result, stats: SyncStats, dry_run: bool = False,
+                             manifest: Optional[SyncManifest] = None, record: Optional[dict] = None,
+                             txn: Optional[WriteTransaction] = None) -> None:
+        """Sanitize a large text file chunk by chunk into a temp file, then stage it as dst."""
+        record = record if record is not None else stats.file_record(src, dst)
+        txn = txn if txn is not None else WriteTransaction.direct()
+        src_hasher = hashlib.blake2b(digest_size=16)
+        out_hasher = hashlib.blake2b(digest_size=16)
+        targets = manifest.targets if manifest is not None else DestinationIndex(self.dst_index_file)
+
+        # Live runs write where the transaction can rename from atomically
+        if not dry_run:
+            temp_dir = txn.temp_dir(dst)
+        else:
+            temp_dir = self.recorder.objects.temp_dir() if self.recorder is not None else None
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{dst.name}.", suffix=".tmp", dir=temp_dir)
+        tmp = Path(tmp_name)
+        staged = False
+        try:
+            # Reading, sanitizing and writing the temp file are interleaved per chunk
+            with stats.phase("sanitize"), open(fd, "wb") as out, open(src, "rb") as raw:
+                reader = io.TextIOWrapper(io.BufferedReader(_HashingReader(raw, src_hasher)),
+                                          encoding="utf-8", errors="replace")
+
+                def write(text: str) -> None:
+                    data = encode_text(text)
+                    out.write(data)
+                    out_hasher.update(data)
+
+                keys_sanitized, sensitive = self.scanner.scan_stream(reader, write, src)
+
+            file_warnings = []
+            if keys_sanitized > 0:
+                file_warnings.append(f"  - Sanitized {keys_sanitized} API key(s) in {src.name}")
+            file_warnings.extend(sensitive)
+            stats.warnings.extend(file_warnings)
+            out_size = tmp.stat().st_size
+            record.update(bytes_read=st.st_size, keys_sanitized=keys_sanitized, warnings=len(file_warnings))
 
+            src_hash, out_hash = src_hasher.hexdigest(), out_hasher.hexdigest()
 
-def sync_directory(src_dir: Path, dst_dir: Path, stats: SyncStats, dry_run: bool = False) -> None:
-    """Recursively sync a directory."""
-    if not src_dir.exists():
-        stats.warnings.append(f"  - Source not found: {src_dir}")
-        return
+            # Check if file changed
+            with stats.phase("compare"):
+                unchanged = targets.matches(dst, out_size, out_hash)
+            if unchanged:
+                if manifest is not None and not dry_run:
+                    manifest.record(src, st, dst, src_hash, out_hash, file_warnings)
+                record["action"] = "unchanged"
+                stats.files_unchanged += 1
+                return
 
-    if src_dir.is_file():
-        sync_file(src_dir, dst_dir, stats, dry_run)
-        return
+            status = "Updated" if dst.exists() else "Added"
+            if not dry_run:
+                def written():
+                    targets.record(dst, out_hash)
+                    if manifest is not None:
+                        manifest.record(src, st, dst, src_hash, out_hash, file_warnings)
+
+                with stats.phase("write"):
+                    txn.stage_file(tmp, dst, written)
+                staged = True
+                record["bytes_written"] = out_size
+            elif self.recorder is not None:
+                self.recorder.add(src, st, dst, src_hash, out_hash, file_warnings, tmp=tmp)
+                staged = True
+
+            record["action"] = status.lower()
+            stats.files_copied += 1
+            sanitize_note = f" (sanitized)" if keys_sanitized > 0 else ""
+            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}{status}: {dst.relative_to(self.target_repo)}{sanitize_note}")
+        finally:
+            if not staged:
+                tmp.unlink(missing_ok=True)
+
+    def _sync_file_isolated(self, src: Path, dst: Path, dry_run: bool, manifest: Optional[SyncManifest],
+                            pools: WorkerPools, txn: Optional[WriteTransaction]) -> SyncStats:
+        """Pool task: sync one file into its own SyncStats so results can be merged in order."""
+        stats = SyncStats()
+        self.sync_file(src, dst, stats, dry_run, manifest, pools, txn)
+        return stats
+
+    def sync_directory(self, src_dir: Path, dst_dir: Path, stats: SyncStats, dry_run: bool = False,
+                       manifest: Optional[SyncManifest] = None, pools: Optional[WorkerPools] = None,
+                       txn: Optional[WriteTransaction] = None) -> None:
+        """Recursively sync a directory (in parallel when pools are given)."""
+        if not src_dir.exists():
+            stats.warnings.append(f"  - Source not found: {src_dir}")
+            stats.unwalked.append(dst_dir)
+            return
+
+        if src_dir.is_file():
+            self.sync_file(src_dir, dst_dir, stats, dry_run, manifest, pools, txn)
+            return
+
+        unreadable: list[Path] = []
+
+        git_entry = None
+        with stats.phase("walk"):
+            files = None
+            if manifest is not None and manifest.git is not None:
+                changed, git_entry = manifest.git.changed_since(src_dir, self.excluder)
+                # Git only knows what changed in the source; with no recorded outputs
+                # under this root (new, lost or invalidated manifest) every file is due
+                if changed is not None and manifest.has_entries_under(src_dir):
+                    files = filter_changed(src_dir, changed, self.excluder)
+                    # Everything git did not report is unchanged; keep its manifest entry
+                    visited = {str(path) for path in changed} | {str(path) for path in files}
+                    stats.files_unchanged += manifest.mark_seen_under(src_dir, visited)
+            if files is None:
+                files = walk_files(src_dir, self.excluder, unreadable)
+            items = [(item, dst_dir / item.relative_to(src_dir)) for item in files]
+        for directory in unreadable:
+            stats.warnings.append(f"  - Cannot read directory: {directory}")
+            stats.unwalked.append(dst_dir / directory.relative_to(src_dir))
+        errors_before = sum(1 for record in stats.files if record["action"] == "error")
+
+        self._sync_items(items, stats, dry_run, manifest, pools, txn)
+
+        # Only advance past this commit once every reported file made it through,
+        # and never on a dry run (nothing was written)
+        errors = sum(1 for record in stats.files if record["action"] == "error") - errors_before
+        if git_entry is not None and not errors and not dry_run:
+            manifest.git.remember(src_dir, git_entry)
+
+    def _sync_items(self, items: list[tuple[Path, Path]], stats: SyncStats, dry_run: bool,
+                    manifest: Optional[SyncManifest], pools: Optional[WorkerPools],
+                    txn: Optional[WriteTransaction]) -> None:
+        """Sync (src, dst) pairs serially, or through the pools with results merged in order."""
+        if pools is None:
+            for item, dst_path in items:
+                self.sync_file(item, dst_path, stats, dry_run, manifest, txn=txn)
+            return
+
+        # Merge per-file results in walk order so output matches a serial run
+        futures = [pools.io.submit(self._sync_file_isolated, item, dst_path, dry_run, manifest, pools, txn)
+                   for item, dst_path in items]
+        for future in futures:
+            stats.merge(future.result())
+
+    def prune_orphans(self, manifest: SyncManifest, stats: SyncStats, dry_run: bool = False,
+                      txn: Optional[WriteTransaction] = None, trash: Optional[Path] = None) -> None:
+        """Delete target files whose source is gone (--mirror).
+
+        Orphans are the destinations in the DestinationIndex that no source
+        visited this run maps to - one set difference, no walk of the target.
+        Only files sync itself wrote are ever candidates. Nothing is pruned under
+        a destination whose source was missing or unreadable this run. With
+        trash, orphans are moved under it (keeping their path in the target)
+        instead of deleted.
+        """
+        txn = txn if txn is not None else WriteTransaction.direct()
+        targets = manifest.targets
+        # Every source visited this run (even one that failed) keeps its destination
+        live = {record["dst"] for record in stats.files if record["src"] is not None}
+        orphans = sorted(targets.entries.keys() - live - manifest.live_destinations())
+        kept: dict[Path, int] = {}
+
+        for key in orphans:
+            dst = Path(key)
+            try:
+                rel = dst.relative_to(self.target_repo)
+            except ValueError:
+                continue  # written to a previous target location
+            guard = next((root for root in stats.unwalked if dst == root or root in dst.parents), None)
+            if guard is not None:
+                kept[guard] = kept.get(guard, 0) + 1
+                continue
+            if not dst.is_file():
+                if not dry_run:
+                    targets.forget(dst)  # already removed by hand
+                continue
+
+            record = stats.file_record(None, dst)
+            if not dry_run:
+                with stats.phase("write"):
+                    txn.stage_delete(dst, trash / rel if trash is not None else None,
+                                     lambda dst=dst: targets.forget(dst))
+            elif self.recorder is not None:
+                self.recorder.add_deletion(dst)
+            record["action"] = "deleted"
+            stats.files_deleted += 1
+            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}Deleted: {rel}")
+
+        for root, count in kept.items():
+            stats.warnings.append(f"  - Not pruning {count} file(s) under {root.relative_to(self.target_repo)}: "
+                                  "source missing or unreadable")
+
+    def create_settings_example(self, stats: SyncStats, dry_run: bool = False,
+                                txn: Optional[WriteTransaction] = None) -> None:
+        """Create sanitized settings.local.example.json."""
+        src = self.claude_dir / "settings.local.json"
+        dst = self.target_repo / "settings.local.example.json"
+
+        if not src.exists():
+            return
+
+        try:
+            content = json.loads(src.read_text(encoding="utf-8"))
+
+            # Sanitize the content
+            sanitized = {
+                "permissions": {
+                    "allow": ["WebFetch(domain:docs.example.com)", "WebSearch"],
+                    "deny": []
+                },
+                "enableAllProjectMcpServers": content.get("enableAllProjectMcpServers", False),
+                "enabledMcpjsonServers": ["context7", "playwright"],
+                "hooks": {}
+            }
+
+            # Include hooks structure but sanitize paths
+            if "hooks" in content:
+                for hook_type, hook_configs in content["hooks"].items():
+                    sanitized["hooks"][hook_type] = []
+                    for config in hook_configs:
+                        sanitized_config = {}
+                        if "matcher" in config:
+                            sanitized_config["matcher"] = config["matcher"]
+                        if "hooks" in config:
+                            sanitized_config["hooks"] = []
+                            for hook in config["hooks"]:
+                                sanitized_hook = {"type": hook.get("type", "command")}
+                                if "command" in hook:
+                                    # Sanitize path
+                                    cmd = hook["command"]
+                                    cmd = re.sub(r"C:\\Users\\[^\\]+", r"C:\\Users\\USERNAME", cmd)
+                                    cmd = re.sub(r"/c/Users/USERNAME/]+", r"/c/Users/USERNAME", cmd)
+                                    sanitized_hook["command"] = cmd
+                                if "statusMessage" in hook:
+                                    sanitized_hook["statusMessage"] = hook["statusMessage"]
+                                sanitized_config["hooks"].append(sanitized_hook)
+                        sanitized["hooks"][hook_type].append(sanitized_config)
+
+            output = json.dumps(sanitized, indent=2)
 
-    for item in src_dir.rglob("*"):
-        if item.is_file() and not should_exclude(item):
-            rel_path = item.relative_to(src_dir)
-            dst_path = dst_dir / rel_path
-            sync_file(item, dst_path, stats, dry_run)
+            if dst.exists():
+                existing = dst.read_text(encoding="utf-8")
+                if existing == output:
+                    stats.files_unchanged += 1
+                    return
 
+            if not dry_run:
+                (txn or WriteTransaction.direct()).stage_bytes(dst, encode_text(output))
+            elif self.recorder is not None:
+                self.recorder.add_example(src, dst, encode_text(output))
 
-def create_settings_example(stats: SyncStats, dry_run: bool = False) -> None:
-    """Create sanitized settings.local.example.json."""
-    src = CLAUDE_DIR / "settings.local.json"
-    dst = TARGET_REPO / "settings.local.example.json"
+            stats.files_copied += 1
+            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}Generated: settings.local.example.json")
 
-    if not src.exists():
-        return
+        except Exception as e:
+            stats.warnings.append(f"  - Error creating settings example: {e}")
 
-    try:
-        content = json.loads(src.read_text(encoding="utf-8"))
+    def create_codex_config_example(self, stats: SyncStats, dry_run: bool = False,
+                                    txn: Optional[WriteTransaction] = None) -> None:
+        """Create sanitized config.toml.example for Codex."""
+        src = self.home / ".codex" / "config.toml"
+        dst = self.target_repo / ".codex" / "config.toml.example"
 
-        # Sanitize the content
-        sanitized = {
-            "permissions": {
-                "allow": ["WebFetch(domain:docs.example.com)", "WebSearch"],
-                "deny": []
-            },
-            "enableAllProjectMcpServers": content.get("enableAllProjectMcpServers", False),
-            "enabledMcpjsonServers": ["context7", "playwright"],
-            "hooks": {}
-        }
+        if not src.exists():
+            return
 
-        # Include hooks structure but sanitize paths
-        if "hooks" in content:
-            for hook_type, hook_configs in content["hooks"].items():
-                sanitized["hooks"][hook_type] = []
-                for config in hook_configs:
-                    sanitized_config = {}
-                    if "matcher" in config:
-                        sanitized_config["matcher"] = config["matcher"]
-                    if "hooks" in config:
-                        sanitized_config["hooks"] = []
-                        for hook in config["hooks"]:
-                            sanitized_hook = {"type": hook.get("type", "command")}
-                            if "command" in hook:
-                                # Sanitize path
-                                cmd = hook["command"]
-                                cmd = re.sub(r"C:\\Users\\[^\\]+", r"C:\\Users\\USERNAME", cmd)
-                                cmd = re.sub(r"/c/Users/USERNAME/]+", r"/c/Users/USERNAME", cmd)
-                                sanitized_hook["command"] = cmd
-                            if "statusMessage" in hook:
-                                sanitized_hook["statusMessage"] = hook["statusMessage"]
-                            sanitized_config["hooks"].append(sanitized_hook)
-                    sanitized["hooks"][hook_type].append(sanitized_config)
-
-        output = json.dumps(sanitized, indent=2)
-
-        if dst.exists():
-            existing = dst.read_text(encoding="utf-8")
-            if existing == output:
-                stats.files_unchanged += 1
-                return
+        try:
+            content = src.read_text(encoding="utf-8")
 
-        if not dry_run:
-            dst.write_text(output, encoding="utf-8")
+            # Create sanitized version
+            sanitized = CODEX_CONFIG_EXAMPLE
 
-        stats.files_copied += 1
-        stats.changes.append(f"  {'[DRY] ' if dry_run else ''}Generated: settings.local.example.json")
+            if dst.exists():
+                existing = dst.read_text(encoding="utf-8")
+                if existing == sanitized:
+                    stats.files_unchanged += 1
+                    return
 
-    except Exception as e:
-        stats.warnings.append(f"  - Error creating settings example: {e}")
+            if not dry_run:
+                (txn or WriteTransaction.direct()).stage_bytes(dst, encode_text(sanitized))
+            elif self.recorder is not None:
+                self.recorder.add_example(src, dst, encode_text(sanitized))
 
+            stats.files_copied += 1
+            stats.changes.append(f"  {'[DRY] ' if dry_run else ''}Generated: .codex/config.toml.example")
 
-def create_codex_config_example(stats: SyncStats, dry_run: bool = False) -> None:
-    """Create sanitized config.toml.example for Codex."""
-    src = HOME / ".codex" / "config.toml"
-    dst = TARGET_REPO / ".codex" / "config.toml.example"
+        except Exception as e:
+            stats.warnings.append(f"  - Error creating Codex config example: {e}")
 
-    if not src.exists():
-        return
+    def example_sources(self) -> dict[Path, Callable]:
+        """Local files that sanitized example configs are generated from."""
+        return {
+            self.claude_dir / "settings.local.json": self.create_settings_example,
+            self.home / ".codex" / "config.toml": self.create_codex_config_example,
+        }
 
-    try:
-        content = src.read_text(encoding="utf-8")
+    def resolve_source(self, path: Path) -> Optional[tuple[Path, Path]]:
+        """Map a changed source path to (src, dst) via the sync map, or None if not synced."""
+        for src_rel, dst_rel in self.sync_map.items():
+            src_root = self.source_root / src_rel
+            if path == src_root:
+                return path, self.target_repo / dst_rel
+            try:
+                rel_path = path.relative_to(src_root)
+            except ValueError:
+                continue
+            if self.excluder.excludes(rel_path):
+                return None
+            return path, self.target_repo / dst_rel / rel_path
+        return None
 
-        # Create sanitized version
-        sanitized = '''# Codex CLI Configuration Example
-# Copy to ~/.codex/config.toml and customize
+    def sync_paths(self, paths: set[Path], stats: SyncStats, dry_run: bool = False,
+                   manifest: Optional[SyncManifest] = None, txn: Optional[WriteTransaction] = None) -> None:
+        """Sync just the given changed source paths through sync_file."""
+        examples = self.example_sources()
+        for path in sorted(paths):
+            if path in examples:
+                examples[path](stats, dry_run, txn)
+                continue
+            resolved = self.resolve_source(path)
+            if resolved is None or not path.is_file():
+                continue  # not synced, or deleted (deletions are not propagated)
+            self.sync_file(*resolved, stats, dry_run, manifest, txn=txn)
+
+    def watch(self, dry_run: bool = False, debounce: float = WATCH_DEBOUNCE) -> None:
+        """Mirror source changes to the target until interrupted."""
+        git = self.manifest is not None and self.manifest.git is not None
+        dir_roots, file_paths = [], list(self.example_sources())
+        for src_rel in self.sync_map:
+            src_path = self.source_root / src_rel
+            (file_paths if src_path.is_file() else dir_roots).append(src_path)
+
+        watcher = make_watcher(dir_roots, file_paths, self.excluder)
+        print(f"Watching {len(dir_roots) + len(file_paths)} source(s) with {type(watcher).__name__} (Ctrl+C to stop)...")
+        try:
+            while True:
+                changed = watcher.wait(None)
+                # Debounce: keep collecting until the burst goes quiet
+                while more := watcher.wait(debounce):
+                    changed |= more
+
+                stats = SyncStats()
+                self._reset_copies()
+                # Each batch holds the state lock like a run, so a /sync started meanwhile waits for it
+                with nullcontext() if dry_run else self.locked():
+                    manifest = self.load_manifest(git=git)
+                    txn = None if dry_run else WriteTransaction(self.staging_dir, self.journal_file)
+                    if watcher.overflowed:
+                        # Lost events - fall back to a manifest-backed pass over everything
+                        watcher.overflowed = False
+                        for src_rel, dst_rel in self.sync_map.items():
+                            self.sync_directory(self.source_root / src_rel, self.target_repo / dst_rel, stats, dry_run, manifest, txn=txn)
+                    else:
+                        self.sync_paths(changed, stats, dry_run, manifest, txn)
+                    if not dry_run:
+                        # One commit (and one round of fsyncs) per debounced batch
+                        txn.commit()
+                        if manifest.git is not None:
+                            manifest.git.advance()
+                        self._save_manifest(manifest)
+
+                stamp = datetime.now().strftime("%H:%M:%S")
+                for line in stats.changes + stats.warnings:
+                    print(f"[{stamp}]{line}")
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+        finally:
+            watcher.close()
+
+    def report(self, stats: SyncStats, dry_run: bool, elapsed: float) -> dict:
+        """Machine-readable summary of a sync run for --report json."""
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "source": str(self.source_root),
+            "target": str(self.target_repo),
+            "dry_run": dry_run,
+            "elapsed": round(elapsed, 6),
+            "totals": {
+                "copied": stats.files_copied,
+                "unchanged": stats.files_unchanged,
+                "skipped": stats.files_skipped,
+                "deleted": stats.files_deleted,
+                "bytes_read": sum(f["bytes_read"] for f in stats.files),
+                "bytes_written": sum(f["bytes_written"] for f in stats.files),
+                "keys_sanitized": sum(f["keys_sanitized"] for f in stats.files),
+            },
+            # Summed across workers, so with --jobs these can exceed elapsed
+            "timings": {name: round(seconds, 6) for name, seconds in stats.timings.items()},
+            "roots": stats.roots,
+            "files": stats.files,
+            "changes": [change.strip() for change in stats.changes],
+            "warnings": [warning.strip() for warning in stats.warnings],
+        }
 
-model = "gpt-5.2-codex"
-model_reasoning_effort = "medium"
-windows_wsl_setup_acknowledged = true
 
-# Trust your project directories
-# [projects.'C:\\Path\\To\\Project']
-# trust_level = "trusted"
+# Module-level entry points, kept for scripts that load this file directly.
+# Each runs on an engine built from the current module configuration.
 
-[notice]
-hide_gpt5_1_migration_prompt = true
-"hide_gpt-5.1-codex-max_migration_prompt" = true
+def sync_file(src: Path, dst: Path, stats: SyncStats, dry_run: bool = False,
+              manifest: Optional[SyncManifest] = None, pools: Optional[WorkerPools] = None,
+              txn: Optional[WriteTransaction] = None) -> None:
+    """Sync a single file with automatic sanitization of sensitive content."""
+    SyncEngine().sync_file(src, dst, stats, dry_run, manifest, pools, txn)
 
-[notice.model_migrations]
-"gpt-5.2" = "gpt-5.2-codex"
 
-[features]
-unified_exec = true
-shell_snapshot = true
-powershell_utf8 = true
-collab = true
-steer = true
-'''
+def sync_directory(src_dir: Path, dst_dir: Path, stats: SyncStats, dry_run: bool = False,
+                   manifest: Optional[SyncManifest] = None, pools: Optional[WorkerPools] = None,
+                   txn: Optional[WriteTransaction] = None) -> None:
+    """Recursively sync a directory (in parallel when pools are given)."""
+    SyncEngine().sync_directory(src_dir, dst_dir, stats, dry_run, manifest, pools, txn)
 
-        if dst.exists():
-            existing = dst.read_text(encoding="utf-8")
-            if existing == sanitized:
-                stats.files_unchanged += 1
-                return
 
-        if not dry_run:
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            dst.write_text(sanitized, encoding="utf-8")
+def create_settings_example(stats: SyncStats, dry_run: bool = False,
+                            txn: Optional[WriteTransaction] = None) -> None:
+    """Create sanitized settings.local.example.json."""
+    SyncEngine().create_settings_example(stats, dry_run, txn)
 
-        stats.files_copied += 1
-        stats.changes.append(f"  {'[DRY] ' if dry_run else ''}Generated: .codex/config.toml.example")
 
-    except Exception as e:
-        stats.warnings.append(f"  - Error creating Codex config example: {e}")
+def create_codex_config_example(stats: SyncStats, dry_run: bool = False,
+                                txn: Optional[WriteTransaction] = None) -> None:
+    """Create sanitized config.toml.example for Codex."""
+    SyncEngine().create_codex_config_example(stats, dry_run, txn)
+
+
+def remove_empty_dirs(files: list[Path], root: Path) -> None:
+    """Remove directories left empty by deleted files, up to (not including) root."""
+    for directory in sorted({f.parent for f in files}, key=lambda p: len(p.parts), reverse=True):
+        while directory != root and root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                break  # not empty (or already gone)
+            directory = directory.parent
+
+
+# Watch mode
+
+
+def walk_dirs(root: Path, matcher: ExcludeMatcher = EXCLUDER) -> Iterator[Path]:
+    """Yield root and every directory below it that walk_files would descend into."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        yield directory
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not matcher.excludes_name(entry.name) and entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+        except (PermissionError, FileNotFoundError):
+            continue
+
+
+class PollingWatcher:
+    """Portable watcher: diffs stat() snapshots of the watched files every interval."""
+
+    def __init__(self, dir_roots: list[Path], file_paths: list[Path], interval: float = WATCH_POLL_INTERVAL,
+                 matcher: ExcludeMatcher = EXCLUDER):
+        self.dir_roots = dir_roots
+        self.file_paths = file_paths
+        self.interval = interval
+        self.matcher = matcher
+        self.overflowed = False
+        self.snapshot = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot = {}
+        paths = [p for root in self.dir_roots if root.is_dir() for p in walk_files(root, self.matcher)]
+        for path in paths + self.file_paths:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout: Optional[float]) -> set[Path]:
+        """Return paths changed within timeout (None = block until something changes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+            current = self._scan()
+            changed = {p for p in current.keys() | self.snapshot.keys() if current.get(p) != self.snapshot.get(p)}
+            self.snapshot = current
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Linux watcher on inotify (through libc via ctypes, no extra dependencies)."""
+
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, dir_roots: list[Path], file_paths: list[Path], matcher: ExcludeMatcher = EXCLUDER):
+        self.matcher = matcher
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.overflowed = False
+        self.watches: dict[int, Path] = {}
+        for root in dir_roots:
+            if root.is_dir():
+                for directory in walk_dirs(root, self.matcher):
+                    self._add_watch(directory)
+        # Single files are watched through their parent directory
+        for path in file_paths:
+            if path.parent.is_dir():
+                self._add_watch(path.parent)
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def wait(self, timeout: Optional[float]) -> set[Path]:
+        """Return paths changed within timeout (None = block until something changes)."""
+        changed: set[Path] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not self.matcher.excludes_name(path.name):
+                    # New tree: watch it and pick up files created before the watch existed
+                    for sub in walk_dirs(path, self.matcher):
+                        self._add_watch(sub)
+                    changed.update(walk_files(path, self.matcher))
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(dir_roots: list[Path], file_paths: list[Path], matcher: ExcludeMatcher = EXCLUDER):
+    """Use inotify where available, otherwise fall back to polling."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(dir_roots, file_paths, matcher)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(dir_roots, file_paths, matcher=matcher)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Sync Claude setup to public repo")
     parser.add_argument("--force", "-f", action="store_true", help="Skip confirmation")
     parser.add_argument("--dry-run", "-n", action="store_true", help="Preview only")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the sync manifest and re-check every file (e.g. after editing the target by hand)")
+    parser.add_argument("--git", action="store_true",
+                        help="Ask git which files changed in sources that are git work trees instead of walking them")
+    parser.add_argument("--mirror", action="store_true",
+                        help="Also delete target files whose source was removed or renamed")
+    parser.add_argument("--trash", action="store_true",
+                        help="With --mirror, move deleted files to the sync state trash folder instead")
+    plan_group = parser.add_mutually_exclusive_group()
+    plan_group.add_argument("--plan", type=Path, metavar="FILE",
+                            help="Dry run that saves the sanitized outputs to FILE for --apply")
+    plan_group.add_argument("--apply", type=Path, metavar="PLAN",
+                            help="Write exactly the outputs saved by --plan (sources are only re-checked by mtime)")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Process files with N parallel workers (default: 1, serial)")
+    parser.add_argument("--watch", "-w", action="store_true",
+                        help="After syncing, keep mirroring source changes until Ctrl+C")
+    parser.add_argument("--report", choices=["text", "json"], default="text",
+                        help="json: print a machine-readable report to stdout (text output goes to stderr)")
     args = parser.parse_args()
+    if args.apply:
+        # The plan already fixed what gets written; these would be silently ignored
+        ignored = [flag for flag, value in (("--dry-run", args.dry_run), ("--full", args.full), ("--git", args.git),
+                                            ("--mirror", args.mirror), ("--jobs", args.jobs != 1)) if value]
+        if ignored:
+            parser.error(f"--apply cannot be combined with {', '.join(ignored)}")
+    if args.plan:
+        args.dry_run = True
+
+    # In json mode the human-readable output moves to stderr so stdout is pure JSON
+    human_output = redirect_stdout(sys.stderr) if args.report == "json" else nullcontext()
+    with human_output:
+        stats, engine, elapsed = run_sync(args)
+
+    if args.report == "json":
+        print(json.dumps(engine.report(stats, args.dry_run, elapsed), indent=2), flush=True)
+
+    if args.watch:
+        with human_output:
+            engine.watch(args.dry_run)
+
+    # Only return error code if there are actual problems (not just sanitization notices)
+    has_errors = any("Error" in w or "Potential sensitive" in w for w in stats.warnings)
+    return 1 if has_errors else 0
+
+
+def run_sync(args: argparse.Namespace) -> tuple[SyncStats, SyncEngine, float]:
+    """Run one full sync. Returns (stats, engine, elapsed seconds)."""
+    started = time.perf_counter()
+    engine = SyncEngine(log=print)
 
     print(f"\n{'='*60}")
     print("AGENT SETUP SYNC")
     print(f"{'='*60}")
-    print(f"Source: {SOURCE_ROOT}")
-    print(f"Target: {TARGET_REPO}")
-    print(f"Mode:   {'DRY RUN' if args.dry_run else 'LIVE'}")
+    print(f"Source: {engine.source_root}")
+    print(f"Target: {engine.target_repo}")
+    if args.plan:
+        print(f"Mode:   PLAN -> {args.plan}")
+    elif args.apply:
+        print(f"Mode:   APPLY {args.apply}")
+    else:
+        print(f"Mode:   {'DRY RUN' if args.dry_run else 'LIVE'}")
+    if args.jobs > 1:
+        print(f"Jobs:   {args.jobs}")
     print(f"{'='*60}\n")
 
-    if not TARGET_REPO.exists():
-        print(f"ERROR: Target repo not found: {TARGET_REPO}")
+    if not engine.target_repo.exists():
+        print(f"ERROR: Target repo not found: {engine.target_repo}")
         sys.exit(1)
 
-    stats = SyncStats()
-
-    # Sync each mapped item
-    print("Syncing files...")
-    for src_rel, dst_rel in SYNC_MAP.items():
-        src_path = SOURCE_ROOT / src_rel
-        dst_path = TARGET_REPO / dst_rel
-
-        print(f"  {src_rel} -> {dst_rel}")
-        sync_directory(src_path, dst_path, stats, args.dry_run)
-
-    # Create sanitized example files
-    print("\nGenerating example configs...")
-    create_settings_example(stats, args.dry_run)
-    create_codex_config_example(stats, args.dry_run)
+    if args.apply:
+        stats = engine.apply(trash=args.trash, plan_file=args.apply)
+    else:
+        stats = engine.run(args.dry_run, args.full, args.git, args.mirror, args.trash, args.jobs, args.plan)
+    elapsed = time.perf_counter() - started
 
     # Print results
     print(f"\n{'='*60}")
@@ -468,6 +2535,8 @@ def main():
     print(f"Files copied/updated: {stats.files_copied}")
     print(f"Files unchanged:      {stats.files_unchanged}")
     print(f"Files skipped:        {stats.files_skipped}")
+    if args.mirror or args.apply:
+        print(f"Files deleted:        {stats.files_deleted}")
 
     if stats.changes:
         print(f"\nChanges:")
@@ -485,16 +2554,16 @@ def main():
 
     print(f"\n{'='*60}")
 
-    if args.dry_run:
+    if args.plan:
+        print(f"PLAN SAVED - review, then run with --apply {args.plan}")
+    elif args.dry_run:
         print("DRY RUN COMPLETE - No files were modified")
     else:
         print("SYNC COMPLETE")
 
     print(f"{'='*60}\n")
 
-    # Only return error code if there are actual problems (not just sanitization notices)
-    has_errors = any("Error" in w or "Potential sensitive" in w for w in stats.warnings)
-    return 1 if has_errors else 0
+    return stats, engine, elapsed
 
 
 if __name__ == "__main__":
@@ -4,29 +4,144 @@ Pre-commit hook: Run programmatic checks before Claude commits.
 
 Triggered by PreToolCall hook on Bash(git commit*).
 Outputs a summary that Claude sees before proceeding.
+
+Run with --daemon to keep tsc --watch, dmypy and eslint_d warm between
+commits; the hook uses the daemon when it is up and runs tools directly
+otherwise.
 """
 
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import signal
+import socket
+import socketserver
 import subprocess
 import sys
 import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+# Total wall-clock budget for all checks together (they run concurrently)
+CHECK_BUDGET = float(os.environ.get('PRE_COMMIT_BUDGET', '60'))
+
+# Set by run_checks: commands are cut off when the budget runs out
+_deadline: Optional[float] = None
+_timed_out: list[str] = []
+_timed_out_lock = threading.Lock()
+
+# Per-check timings from the last run_checks, appended to .git/run-checks/timings.jsonl
+_timings: list['CheckTiming'] = []
+_current = threading.local()
+TIMINGS_MAX_BYTES = 1024 * 1024
+
+# A check to run: (name as reported, callable returning issues, file count)
+Check = tuple[str, Callable[[], list[dict]], int]
+
+# Exit code reported for commands cut off by their timeout
+TIMED_OUT = 124
+
+# Lint/type-check results are cached under .git/run-checks by staged blob SHA
+CACHE_ENABLED = os.environ.get('PRE_COMMIT_CACHE', '1') != '0'
+CACHE_VERSION = 2
+
+# Optional checker daemon (--daemon); set PRE_COMMIT_DAEMON=0 to ignore it
+DAEMON_ENABLED = os.environ.get('PRE_COMMIT_DAEMON', '1') != '0'
+DAEMON_WAIT = 5.0  # seconds a request waits for tsc --watch to catch up
+TS_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx')
+
+# Files marking a project root, for each kind of project there are checks for
+ROOT_MARKERS = {
+    'node': ('package.json',),
+    'python': ('pyproject.toml', 'requirements.txt', 'setup.py', 'setup.cfg'),
+}
+
+# Use dmypy (which leaves a server running between commits) even without the daemon
+USE_DMYPY = os.environ.get('PRE_COMMIT_DMYPY', '0') == '1'
+# Files per process before a tool's input is split across cores
+BATCH_JOBS = int(os.environ.get('PRE_COMMIT_JOBS', '0')) or os.cpu_count() or 1
+MIN_BATCH_FILES = 8
+
+# Added lines matching any of these are flagged by the secrets check
+SECRET_PATTERNS = ['API_KEY=', 'SECRET=', 'PASSWORD=', 'PRIVATE_KEY', 'Bearer ']
+SECRET_PATTERN = re.compile('|'.join(re.escape(p) for p in SECRET_PATTERNS).encode())
+MAX_SECRET_FINDINGS = int(os.environ.get('PRE_COMMIT_MAX_FINDINGS', '50'))
+
+ESLINT_CONFIGS = ('package.json', '.eslintrc', '.eslintrc.js', '.eslintrc.cjs', '.eslintrc.json',
+                  '.eslintrc.yml', '.eslintrc.yaml', 'eslint.config.js', 'eslint.config.mjs',
+                  'eslint.config.cjs', 'eslint.config.ts')
+
 
+class CheckTiming:
+    """Wall time, subprocess time and file count for one check.
 
-def run_command(cmd: list, timeout: int = 60) -> tuple[int, str]:
+    Subprocess time is the sum over every command the check ran, so
+    parallel batches can make it larger than the wall time.
+    """
+
+    def __init__(self, name: str, files: int):
+        self.name = name
+        self.files = files
+        self.wall = 0.0
+        self.subprocess = 0.0
+        self.procs = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.subprocess += seconds
+            self.procs += 1
+
+    def record(self) -> dict:
+        return {'check': self.name, 'wall_ms': round(self.wall * 1000), 'sub_ms': round(self.subprocess * 1000),
+                'procs': self.procs, 'files': self.files}
+
+
+def timed(timing: Optional[CheckTiming], func: Callable, *args):
+    """Call func with its subprocess time charged to timing (works across threads)."""
+    previous = getattr(_current, 'timing', None)
+    _current.timing = timing
+    try:
+        return func(*args)
+    finally:
+        _current.timing = previous
+
+
+def _charge(start: float):
+    timing = getattr(_current, 'timing', None)
+    if timing is not None:
+        timing.add(time.monotonic() - start)
+
+
+def run_command(cmd: list, timeout: int = 60, cwd: Optional[Path] = None) -> tuple[int, str]:
     """Run a command and return (exit_code, output)."""
+    if _deadline is not None:
+        timeout = max(0.1, min(timeout, _deadline - time.monotonic()))
+    start = time.monotonic()
     try:
         result = subprocess.run(
             cmd,
             capture_output=True,
             text=True,
             timeout=timeout,
-            cwd=Path.cwd()
+            cwd=cwd or Path.cwd()
         )
         return result.returncode, (result.stdout + result.stderr).strip()
     except subprocess.TimeoutExpired:
-        return 1, "Command timed out"
+        with _timed_out_lock:
+            _timed_out.append(' '.join(cmd[:2]))
+        return TIMED_OUT, "Command timed out"
     except FileNotFoundError:
         return -1, "Command not found"
+    finally:
+        _charge(start)
 
 
 def detect_project_type() -> str:
@@ -43,130 +158,1065 @@ def detect_project_type() -> str:
     return 'unknown'
 
 
+class StagedSnapshot:
+    """Staged names, statuses and blob SHAs from a single git call.
+
+    `git diff --cached --raw -z` prints one record per file
+    (":old_mode new_mode old_sha new_sha status\\0path\\0"), so one fork
+    gives every check what it needs. Paths come back unquoted, so names with
+    spaces or non-ASCII characters survive intact. The patch itself is not
+    kept here: the secrets scan streams it (see scan_staged_secrets).
+    """
+
+    def __init__(self, output: str = ''):
+        self.status: dict[str, str] = {}
+        self.blobs: dict[str, str] = {}
+        fields = output.split('\0')
+        for meta, path in zip(fields[::2], fields[1::2]):
+            parts = meta.split()
+            if len(parts) < 5 or not path:
+                continue
+            self.status[path] = parts[4][:1]
+            self.blobs[path] = parts[3]
+
+    @classmethod
+    def load(cls) -> 'StagedSnapshot':
+        try:
+            result = subprocess.run(
+                ['git', 'diff', '--cached', '--raw', '-z', '--no-abbrev', '--no-renames'],
+                capture_output=True,
+                encoding='utf-8',
+                errors='replace',
+                timeout=30,
+                cwd=Path.cwd()
+            )
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            return cls()
+        return cls(result.stdout if result.returncode == 0 else '')
+
+    @property
+    def files(self) -> list[str]:
+        """Staged paths that still exist in the index (deletions left out)."""
+        return [path for path, status in self.status.items() if status != 'D']
+
+
+_snapshot: Optional[StagedSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def staged_snapshot() -> StagedSnapshot:
+    """The staged snapshot for this hook run, fetched from git once."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = StagedSnapshot.load()
+        return _snapshot
+
+
 def get_staged_files() -> list[str]:
     """Get list of staged files."""
-    code, output = run_command(['git', 'diff', '--cached', '--name-only'])
-    if code == 0 and output:
-        return [f for f in output.split('\n') if f.strip()]
-    return []
+    return staged_snapshot().files
 
 
-def check_node() -> list[dict]:
-    """Run Node.js checks."""
-    issues = []
-    staged = get_staged_files()
-    ts_files = [f for f in staged if f.endswith(('.ts', '.tsx', '.js', '.jsx'))]
+@lru_cache(maxsize=None)
+def git_paths() -> tuple[Optional[Path], Optional[Path]]:
+    """The repository's .git directory and top-level directory."""
+    code, output = run_command(['git', 'rev-parse', '--absolute-git-dir', '--show-toplevel'], timeout=10)
+    lines = output.split('\n') if code == 0 else []
+    if len(lines) == 2:
+        return Path(lines[0]), Path(lines[1])
+    return (Path(lines[0]) if lines else None), None
 
-    if not ts_files:
-        return issues
-
-    # TypeScript check
-    code, output = run_command(['npx', 'tsc', '--noEmit', '--pretty', 'false'])
-    if code != 0 and code != -1:
-        error_count = output.count('error TS')
-        if error_count > 0:
-            issues.append({
-                'check': 'TypeScript',
-                'status': 'FAIL',
-                'count': error_count,
-                'preview': output[:300] if output else ''
-            })
-
-    # ESLint check on staged files only
-    if ts_files:
-        code, output = run_command(['npx', 'eslint'] + ts_files[:10] + ['--format', 'compact'])
-        if code != 0 and code != -1:
-            error_lines = [l for l in output.split('\n') if ': line ' in l and 'error' in l.lower()]
-            if error_lines:
-                issues.append({
-                    'check': 'ESLint',
-                    'status': 'FAIL',
-                    'count': len(error_lines),
-                    'preview': '\n'.join(error_lines[:5])
-                })
 
-    return issues
+def git_dir() -> Optional[Path]:
+    """The repository's .git directory (resolves worktree .git files)."""
+    return git_paths()[0]
 
 
-def check_python() -> list[dict]:
-    """Run Python checks."""
-    issues = []
-    staged = get_staged_files()
-    py_files = [f for f in staged if f.endswith('.py')]
+def repo_root() -> Path:
+    """Top of the working tree; staged paths are relative to it."""
+    return git_paths()[1] or Path.cwd()
+
+
+def file_kind(path: str) -> Optional[str]:
+    """Which kind of project checks a staged file, if any."""
+    if path.endswith('.py'):
+        return 'python'
+    if path.endswith(TS_EXTENSIONS):
+        return 'node'
+    return None
+
+
+@lru_cache(maxsize=None)
+def nearest_root(directory: Path, kind: str) -> Optional[Path]:
+    """Closest directory at or above `directory` holding a marker for kind.
+
+    Memoized per directory, so files sharing a folder cost one lookup and
+    each walk stops at the first directory an earlier file already visited.
+    The walk never leaves the repository.
+    """
+    if any((directory / marker).is_file() for marker in ROOT_MARKERS[kind]):
+        return directory
+    if directory == repo_root() or directory.parent == directory:
+        return None
+    return nearest_root(directory.parent, kind)
+
+
+def project_roots(files: list[str]) -> dict[tuple[str, Path], list[str]]:
+    """Group staged files by (kind, nearest project root).
+
+    The grouped paths are relative to their root, ready for a tool running
+    there. Files outside any project are left out.
+    """
+    top = repo_root()
+    groups: dict[tuple[str, Path], list[str]] = {}
+    for f in files:
+        kind = file_kind(f)
+        if kind is None:
+            continue
+        path = top / f
+        root = nearest_root(path.parent, kind)
+        if root is not None:
+            groups.setdefault((kind, root), []).append(path.relative_to(root).as_posix())
+    return dict(sorted(groups.items(), key=lambda item: (str(item[0][1]), item[0][0])))
+
+
+def root_slug(root: Path) -> str:
+    """Suffix that keeps per-root state apart; empty for the repository root."""
+    if root == repo_root():
+        return ''
+    return '-' + hashlib.sha1(root.as_posix().encode()).hexdigest()[:10]
+
+
+def check_label(name: str, root: Path) -> str:
+    """Check name as reported, qualified with the package for nested roots."""
+    if root == repo_root():
+        return name
+    return f"{name} ({root.relative_to(repo_root()).as_posix()})"
+
+
+def state_path(name: str) -> Optional[Path]:
+    """A file under .git/run-checks, where the hook keeps its state."""
+    root = git_dir()
+    if root is None:
+        return None
+    try:
+        (root / 'run-checks').mkdir(exist_ok=True)
+    except OSError:
+        return None
+    return root / 'run-checks' / name
+
+
+def node_bin(tool: str, root: Optional[Path] = None) -> list[str]:
+    """Command prefix for a Node tool, skipping npx resolution when installed locally."""
+    local = shutil.which(tool, path=str((root or Path.cwd()) / 'node_modules' / '.bin'))
+    return [local] if local else ['npx', tool]
+
+
+def blob_id(path: Path) -> Optional[str]:
+    """Git blob SHA of the working-tree file, computed without forking git."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def cacheable_blobs(files: list[str], root: Path) -> dict[str, str]:
+    """Staged blob SHAs of the files whose working copy matches the index.
+
+    Linters read the working tree, so a cached result is only valid for a
+    file when what is on disk is exactly what is staged. Files are relative
+    to root; the snapshot is keyed relative to the repository top.
+    """
+    staged = staged_snapshot().blobs
+    top = repo_root()
+    blobs = {}
+    for f in files:
+        path = root / f
+        blob = staged.get(path.relative_to(top).as_posix())
+        if blob and blob_id(path) == blob:
+            blobs[f] = blob
+    return blobs
+
+
+def program_state(root: Path) -> Optional[str]:
+    """Digest of everything else a whole-program check can read under root.
+
+    Type checkers follow imports into files that are not staged, so the key
+    also covers the HEAD tree, every staged change, and the size and mtime of
+    each modified or untracked (not ignored) file. None when git cannot say.
+    """
+    code, tree = run_command(['git', 'rev-parse', '--verify', '-q', 'HEAD^{tree}'], timeout=10, cwd=root)
+    if code not in (0, 1):
+        return None
+    tree = tree if code == 0 else ''  # no commits yet
+    code, output = run_command(['git', 'ls-files', '-z', '-m', '-o', '--exclude-standard', '--', '.'], cwd=root)
+    if code != 0:
+        return None
+    snapshot = staged_snapshot()
+    digest = hashlib.sha1(f"{tree}\0".encode())
+    for path in sorted(snapshot.status):
+        digest.update(f"{path}:{snapshot.status[path]}:{snapshot.blobs[path]}\0".encode())
+    for rel in sorted(set(filter(None, output.split('\0')))):
+        try:
+            st = os.stat(root / rel)
+            digest.update(f"{rel}:{st.st_size}:{st.st_mtime_ns}\0".encode())
+        except OSError:
+            digest.update(f"{rel}:-\0".encode())
+    return digest.hexdigest()
+
+
+def tool_fingerprint(tool: str, root: Path) -> str:
+    """Identify the installed tool version without running it."""
+    package = root / 'node_modules' / tool / 'package.json'
+    if package.exists():
+        try:
+            return f"{tool}@{json.loads(package.read_text(encoding='utf-8')).get('version', '?')}"
+        except (OSError, ValueError):
+            pass
+    exe = shutil.which(tool)
+    if exe:
+        st = os.stat(exe)
+        return f"{os.path.realpath(exe)}:{st.st_size}:{st.st_mtime_ns}"
+    return tool
+
+
+def config_hash(names: tuple[str, ...], root: Path) -> str:
+    """Hash of whichever of the named config files exist in the project."""
+    digest = hashlib.sha1()
+    for name in names:
+        path = root / name
+        if path.is_file():
+            digest.update(name.encode() + b'\0' + path.read_bytes() + b'\0')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Per-check results stored under .git/run-checks, keyed by blob SHA.
+
+    Each entry maps a path to the blob it was checked at and the diagnostics
+    the tool reported for it. The whole file is dropped when the tool version
+    or its config changes. Whole-program checks store a single entry under
+    WHOLE_PROGRAM keyed by a hash of every input blob.
+    """
+
+    WHOLE_PROGRAM = '*'
+
+    def __init__(self, check: str, tool: str, config: tuple[str, ...], root: Path):
+        self.root = root
+        self.fingerprint = f"{tool_fingerprint(tool, root)}|{config_hash(config, root)}"
+        self.path = state_path(f"{check.lower()}{root_slug(root)}.json") if CACHE_ENABLED else None
+        self.entries: dict[str, dict] = {}
+        self.dirty = False
+        if self.path and self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding='utf-8'))
+                if data.get('version') == CACHE_VERSION and data.get('fingerprint') == self.fingerprint:
+                    self.entries = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+
+    def get(self, key: str, blob: Optional[str]) -> Optional[list['Diagnostic']]:
+        entry = self.entries.get(key)
+        if blob and entry and entry.get('blob') == blob:
+            return [Diagnostic(*row) for row in entry['diagnostics']]
+        return None
+
+    def put(self, key: str, blob: Optional[str], diagnostics: list['Diagnostic']):
+        if self.path and blob:
+            self.entries[key] = {'blob': blob, 'diagnostics': [list(d) for d in diagnostics]}
+            self.dirty = True
+
+    def save(self):
+        if not (self.path and self.dirty):
+            return
+        data = {'version': CACHE_VERSION, 'fingerprint': self.fingerprint, 'files': self.entries}
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data), encoding='utf-8')
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+def max_command_length() -> int:
+    """Room left for file arguments on one command line."""
+    if os.name == 'nt':
+        # npx and friends are .cmd shims, so cmd.exe's 8191 limit applies
+        return 8000
+    try:
+        arg_max = os.sysconf('SC_ARG_MAX')
+    except (AttributeError, ValueError, OSError):
+        arg_max = 128 * 1024
+    env_size = sum(len(k) + len(v) + 2 for k, v in os.environ.items())
+    return max(4096, min(arg_max - env_size, 1024 * 1024) // 2)
+
+
+def make_batches(files: list[str], jobs: int, limit: int, root: Path) -> list[list[str]]:
+    """Split files into size-balanced batches that fit on a command line.
+
+    Largest files go first into the lightest batch with room left (greedy
+    longest-processing-time), which keeps batch run times close. Small sets
+    stay in one batch so process startup is not paid for nothing. Batches
+    keep the files' original order.
+    """
+    def size(f: str) -> int:
+        try:
+            return os.path.getsize(root / f)
+        except OSError:
+            return 0
+
+    count = max(1, min(jobs, len(files) // MIN_BATCH_FILES))
+    batches: list[list] = [[0, 0, []] for _ in range(count)]
+    for f in sorted(files, key=size, reverse=True):
+        arg = len(f) + 3
+        fitting = [b for b in batches if b[1] + arg <= limit or not b[2]]
+        if not fitting:
+            fitting = [[0, 0, []]]
+            batches.append(fitting[0])
+        batch = min(fitting, key=lambda b: b[0])
+        batch[0] += size(f)
+        batch[1] += arg
+        batch[2].append(f)
+
+    order = {f: i for i, f in enumerate(files)}
+    return [sorted(b[2], key=order.__getitem__) for b in batches if b[2]]
+
+
+def run_batched(cmd: Callable[[list[str]], list], files: list[str], root: Path, jobs: int = 1) -> tuple[int, str]:
+    """Run a tool over files in parallel batches and merge the results.
+
+    The merged exit code is the worst one: a timeout wins, then the highest
+    code; "not found" (-1) only when every batch hit it.
+    """
+    limit = max_command_length() - sum(len(str(a)) + 3 for a in cmd([]))
+    batches = make_batches(files, jobs, limit, root)
+    if len(batches) == 1:
+        return run_command(cmd(batches[0]), cwd=root)
+
+    timing = getattr(_current, 'timing', None)
+    with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+        results = list(pool.map(lambda batch: timed(timing, run_command, cmd(batch), 60, root), batches))
+    codes = [code for code, _ in results]
+    if TIMED_OUT in codes:
+        code = TIMED_OUT
+    elif all(c == -1 for c in codes):
+        code = -1
+    else:
+        code = max(codes)
+    return code, '\n'.join(output for _, output in results if output)
+
+
+class Diagnostic(NamedTuple):
+    """One finding from any tool, with its path relative to the project root."""
+
+    path: str
+    line: int
+    col: int
+    code: str
+    message: str
+    severity: str = 'error'
+
+    def format(self) -> str:
+        location = f"{self.path}:{self.line}:{self.col}:" if self.line else (f"{self.path}:" if self.path else '')
+        return ' '.join(part for part in (location, self.code, self.message) if part)
+
+
+_NON_SPACE = re.compile(r'\S')
+TSC_LINE = re.compile(r'^(?:(.+?)\((\d+),(\d+)\): )?(error|warning) (TS\d+): (.*)$')
+MYPY_LINE = re.compile(r'^(.+?):(\d+):(?:(\d+):)? (error|warning|note): (.*?)(?:  \[([\w-]+)\])?$')
+
+
+def iter_json(text: str):
+    """Yield each JSON value in text, in one pass.
+
+    Handles a single array, JSON lines, and the outputs of several batches
+    joined together; lines that are not JSON (stderr chatter) are skipped.
+    """
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        match = _NON_SPACE.search(text, pos)
+        if not match:
+            return
+        try:
+            value, pos = decoder.raw_decode(text, match.start())
+        except ValueError:
+            newline = text.find('\n', match.start())
+            if newline < 0:
+                return
+            pos = newline + 1
+            continue
+        yield value
+
+
+def relative(path: str, root: Path) -> str:
+    """Tool-reported path relative to root, as staged paths are."""
+    if not path:
+        return ''
+    if os.path.isabs(path):
+        try:
+            return Path(path).relative_to(root).as_posix()
+        except ValueError:
+            return Path(path).as_posix()
+    return Path(path).as_posix()
+
 
+def parse_ruff(output: str, root: Path) -> list[Diagnostic]:
+    """`ruff check --output-format json`: one array of violations."""
+    diagnostics = []
+    for batch in iter_json(output):
+        for item in batch if isinstance(batch, list) else []:
+            location = item.get('location') or {}
+            diagnostics.append(Diagnostic(relative(item.get('filename', ''), root), location.get('row', 0),
+                                          location.get('column', 0), item.get('code') or '', item.get('message', '')))
+    return diagnostics
+
+
+def parse_eslint(output: str, root: Path) -> list[Diagnostic]:
+    """`eslint -f json`: one result per file, each with its messages."""
+    diagnostics = []
+    for batch in iter_json(output):
+        for result in batch if isinstance(batch, list) else []:
+            path = relative(result.get('filePath', ''), root)
+            for msg in result.get('messages', []):
+                severity = 'error' if msg.get('severity') == 2 else 'warning'
+                diagnostics.append(Diagnostic(path, msg.get('line', 0), msg.get('column', 0),
+                                              msg.get('ruleId') or '', msg.get('message', ''), severity))
+    return diagnostics
+
+
+def parse_mypy(output: str, root: Path) -> list[Diagnostic]:
+    """`mypy -O json` lines, or classic text output from older mypy."""
+    diagnostics = []
+    for line in output.split('\n'):
+        if line.startswith('{'):
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            diagnostics.append(Diagnostic(relative(item.get('file', ''), root), item.get('line') or 0,
+                                          max(0, item.get('column') or 0), item.get('code') or '',
+                                          item.get('message', ''), item.get('severity', 'error')))
+            continue
+        match = MYPY_LINE.match(line)
+        if match:
+            path, lineno, col, severity, message, code = match.groups()
+            diagnostics.append(Diagnostic(relative(path, root), int(lineno), int(col or 0), code or '',
+                                          message, severity))
+    return diagnostics
+
+
+def parse_tsc(output: str, root: Path) -> list[Diagnostic]:
+    """`tsc --pretty false`: "file(line,col): error TSxxxx: message" plus indented continuations."""
+    diagnostics = []
+    for line in output.split('\n'):
+        match = TSC_LINE.match(line.strip())
+        if match and not line[:1].isspace():
+            path, lineno, col, severity, code, message = match.groups()
+            diagnostics.append(Diagnostic(relative(path or '', root), int(lineno or 0), int(col or 0),
+                                          code, message, severity))
+        elif diagnostics and line[:1].isspace() and line.strip():
+            last = diagnostics[-1]
+            diagnostics[-1] = last._replace(message=f"{last.message} {line.strip()}")
+    return diagnostics
+
+
+def failure(check: str, diagnostics: list[Diagnostic]) -> list[dict]:
+    """A FAIL issue for the errors among diagnostics, previewing the first few."""
+    errors = [d for d in diagnostics if d.severity == 'error']
+    if not errors:
+        return []
+    return [{
+        'check': check,
+        'status': 'FAIL',
+        'count': len(errors),
+        'preview': '\n'.join(d.format() for d in errors[:5])
+    }]
+
+
+def run_cached_per_file(cache: ResultCache, files: list[str], cmd: Callable[[list[str]], list],
+                        parse: Callable[[str, Path], list[Diagnostic]], ok_codes: tuple[int, ...] = (0, 1),
+                        jobs: int = 1) -> list[Diagnostic]:
+    """Run a per-file tool on the files without a cached result.
+
+    Returns the diagnostics for all files, cached ones included, in file
+    order. Results are only stored when the tool ran to completion.
+    """
+    blobs = cacheable_blobs(files, cache.root)
+    results: dict[str, list[Diagnostic]] = {}
+    misses = []
+    for f in files:
+        hit = cache.get(f, blobs.get(f))
+        if hit is None:
+            misses.append(f)
+        else:
+            results[f] = hit
+
+    stray = []
+    if misses:
+        code, output = run_batched(cmd, misses, cache.root, jobs)
+        fresh: dict[str, list[Diagnostic]] = {f: [] for f in misses}
+        if code != -1:
+            for diagnostic in parse(output, cache.root):
+                (fresh[diagnostic.path] if diagnostic.path in fresh else stray).append(diagnostic)
+        results.update(fresh)
+        if code in ok_codes and not stray:
+            for f in misses:
+                cache.put(f, blobs.get(f), fresh[f])
+        cache.save()
+
+    return [d for f in files for d in results.get(f, [])] + stray
+
+
+def run_cached_whole(cache: ResultCache, inputs: list[str], run: Callable[[], tuple[int, str]],
+                     parse: Callable[[str, Path], list[Diagnostic]],
+                     ok_codes: tuple[int, ...] = (0, 1)) -> list[Diagnostic]:
+    """Run a whole-program tool unless the same inputs were checked before.
+
+    The key covers every input blob and program_state(), so a repeat commit
+    of unchanged content returns at once; any edit to an input, or to any
+    other file the tool could import, runs the tool again.
+    """
+    blobs = cacheable_blobs(inputs, cache.root)
+    key = None
+    state = program_state(cache.root) if len(blobs) == len(inputs) else None
+    if state is not None:
+        key = hashlib.sha1('\0'.join([state] + [f"{f}:{blobs[f]}" for f in sorted(blobs)]).encode()).hexdigest()
+        hit = cache.get(ResultCache.WHOLE_PROGRAM, key)
+        if hit is not None:
+            return hit
+
+    code, output = run()
+    diagnostics = parse(output, cache.root) if code != -1 else []
+    if code in ok_codes:
+        cache.put(ResultCache.WHOLE_PROGRAM, key, diagnostics)
+        cache.save()
+    return diagnostics
+
+
+def node_checks(root: Path, ts_files: list[str]) -> list[Check]:
+    """Node.js checks to run in one package for its staged files."""
+    if not ts_files:
+        return []
+    return [
+        (check_label('TypeScript', root), lambda: check_typescript(root, ts_files), len(ts_files)),
+        (check_label('ESLint', root), lambda: check_eslint(root, ts_files), len(ts_files)),
+    ]
+
+
+def python_checks(root: Path, py_files: list[str]) -> list[Check]:
+    """Python checks to run in one project for its staged files."""
     if not py_files:
-        return issues
-
-    # Ruff check
-    code, output = run_command(['ruff', 'check'] + py_files[:10])
-    if code != 0 and code != -1:
-        error_lines = [l for l in output.split('\n') if '.py:' in l]
-        if error_lines:
-            issues.append({
-                'check': 'Ruff',
-                'status': 'FAIL',
-                'count': len(error_lines),
-                'preview': '\n'.join(error_lines[:5])
-            })
-
-    # Mypy check
-    code, output = run_command(['mypy'] + py_files[:10] + ['--ignore-missing-imports'])
-    if code != 0 and code != -1:
-        error_lines = [l for l in output.split('\n') if ': error:' in l]
-        if error_lines:
-            issues.append({
-                'check': 'Mypy',
-                'status': 'FAIL',
-                'count': len(error_lines),
-                'preview': '\n'.join(error_lines[:5])
-            })
+        return []
+    return [
+        (check_label('Ruff', root), lambda: check_ruff(root, py_files), len(py_files)),
+        (check_label('Mypy', root), lambda: check_mypy(root, py_files), len(py_files)),
+    ]
 
-    return issues
+
+def check_typescript(root: Path, ts_files: list[str]) -> list[dict]:
+    """Type-check the whole package with tsc."""
+    cache = ResultCache('TypeScript', 'typescript', ('tsconfig.json', 'package.json'), root)
+    diagnostics = run_cached_whole(cache, ts_files, lambda: run_tsc(root, ts_files), parse_tsc, ok_codes=(0, 1, 2))
+    return failure(check_label('TypeScript', root), diagnostics)
+
+
+def check_eslint(root: Path, ts_files: list[str]) -> list[dict]:
+    """Lint the staged files only."""
+    cache = ResultCache('ESLint', 'eslint', ESLINT_CONFIGS, root)
+    eslint_d = shutil.which('eslint_d', path=str(root / 'node_modules' / '.bin')) or shutil.which('eslint_d')
+    if eslint_d and daemon_running():
+        # One warm server answers every request, so there is nothing to spread
+        eslint, jobs = [eslint_d], 1
+    else:
+        # ESLint is single-threaded, so spread the files across cores
+        eslint, jobs = node_bin('eslint', root), BATCH_JOBS
+    diagnostics = run_cached_per_file(cache, ts_files, lambda files: eslint + files + ['-f', 'json'],
+                                      parse_eslint, jobs=jobs)
+    return failure(check_label('ESLint', root), diagnostics)
+
+
+def check_ruff(root: Path, py_files: list[str]) -> list[dict]:
+    """Lint the staged files with Ruff."""
+    cache = ResultCache('Ruff', 'ruff', ('pyproject.toml', 'ruff.toml', '.ruff.toml'), root)
+    # Ruff already uses every core; batches only keep the command line short
+    diagnostics = run_cached_per_file(cache, py_files,
+                                      lambda files: ['ruff', 'check', '--output-format', 'json'] + files, parse_ruff)
+    return failure(check_label('Ruff', root), diagnostics)
+
+
+def check_mypy(root: Path, py_files: list[str]) -> list[dict]:
+    """Type-check the staged files with Mypy."""
+    cache = ResultCache('Mypy', 'mypy', ('pyproject.toml', 'mypy.ini', '.mypy.ini', 'setup.cfg'), root)
+    diagnostics = run_cached_whole(cache, py_files, lambda: run_mypy(root, py_files), parse_mypy)
+    return failure(check_label('Mypy', root), diagnostics)
+
+
+def scan_staged_secrets(max_findings: int = MAX_SECRET_FINDINGS) -> tuple[list[str], bool]:
+    """Stream the staged diff and report added lines matching SECRET_PATTERN.
+
+    git's stdout is read line by line from a pipe, so memory stays flat on
+    huge lockfile or vendored commits. Each finding is "path:line: +text".
+    Returns (findings, stopped_early); git is killed as soon as max_findings
+    is reached or the time budget runs out.
+    """
+    found = []
+    stopped = False
+    start = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            ['git', 'diff', '--cached', '-U0', '--no-color', '--no-ext-diff'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=Path.cwd()
+        )
+    except FileNotFoundError:
+        return found, stopped
+
+    path = ''
+    lineno = 0
+    in_hunk = False
+    try:
+        for n, line in enumerate(proc.stdout):
+            if line.startswith(b'+') and in_hunk:
+                if SECRET_PATTERN.search(line):
+                    text = line[:80].rstrip(b'\r\n').decode('utf-8', 'replace')
+                    found.append(f"{path}:{lineno}: {text}")
+                    if len(found) >= max_findings:
+                        stopped = True
+                        break
+                lineno += 1
+            elif line.startswith(b'@@'):
+                # "@@ -a,b +c,d @@": added lines are numbered from c
+                new = line.split(b' ')[2]
+                lineno = int(new[1:].split(b',')[0])
+                in_hunk = True
+            elif line.startswith(b'diff --git'):
+                in_hunk = False
+            elif line.startswith(b'+++ ') and not in_hunk:
+                name = line[4:].rstrip(b'\r\n').rstrip(b'\t').decode('utf-8', 'replace')
+                path = name[2:] if name.startswith('b/') else name
+            elif line.startswith(b' ') and in_hunk:
+                lineno += 1
+            if n % 4096 == 0 and _deadline is not None and time.monotonic() > _deadline:
+                with _timed_out_lock:
+                    _timed_out.append('git diff')
+                stopped = True
+                break
+    finally:
+        proc.kill()
+        proc.stdout.close()
+        proc.wait()
+        _charge(start)
+
+    return found, stopped
 
 
 def check_secrets() -> list[dict]:
     """Check for potential secrets in staged files."""
     issues = []
-    staged = get_staged_files()
-
-    if not staged:
-        return issues
 
     # Check staged diff for secret patterns
-    code, output = run_command(['git', 'diff', '--cached'])
-    if code == 0 and output:
-        patterns = ['API_KEY=', 'SECRET=', 'PASSWORD=', 'PRIVATE_KEY', 'Bearer ']
-        found = []
-        for line in output.split('\n'):
-            if line.startswith('+') and not line.startswith('+++'):
-                for pattern in patterns:
-                    if pattern in line:
-                        found.append(line[:80])
-                        break
+    found, stopped = scan_staged_secrets()
+    if found:
+        preview = '\n'.join(found[:3])
+        if stopped:
+            preview += f"\n(stopped after {len(found)} findings)"
+        issues.append({
+            'check': 'Secrets',
+            'status': 'WARN',
+            'count': len(found),
+            'preview': preview
+        })
+
+    return issues
+
+
+def run_tsc(root: Path, ts_files: list[str]) -> tuple[int, str]:
+    """Type-check with tsc, asking the daemon's watcher first."""
+    inputs = [root / f for f in ts_files] + [root / 'tsconfig.json']
+    since = max((os.path.getmtime(f) for f in inputs if f.exists()), default=0.0)
+    reply = daemon_request({'check': 'tsc', 'root': str(root), 'since': since, 'timeout': DAEMON_WAIT},
+                           timeout=DAEMON_WAIT + 1)
+    if reply and 'code' in reply:
+        return reply['code'], reply['output']
+
+    cmd = node_bin('tsc', root) + ['--noEmit', '--pretty', 'false']
+    build_info = state_path(f"tsbuildinfo{root_slug(root)}")
+    if build_info:
+        # Rebuild only what changed since the last run (--noEmit needs TS 4.0+)
+        code, output = run_command(cmd + ['--incremental', '--tsBuildInfoFile', str(build_info)], cwd=root)
+        if 'error TS5' not in output:
+            return code, output
+    return run_command(cmd, cwd=root)
+
+
+def run_mypy(root: Path, py_files: list[str]) -> tuple[int, str]:
+    """Type-check with dmypy when available and wanted, plain mypy otherwise.
+
+    Asks for JSON lines (`-O json`, mypy 1.11+) and falls back to text with
+    columns and error codes on older versions; parse_mypy reads both.
+    """
+    status_file = state_path(f"dmypy{root_slug(root)}.json")
+    if status_file and shutil.which('dmypy') and (USE_DMYPY or daemon_running()):
+        # dmypy keeps the whole program loaded between commits
+        def run(flags: list[str]) -> tuple[int, str]:
+            return run_command(['dmypy', '--status-file', str(status_file), 'run', '--']
+                               + py_files + ['--ignore-missing-imports'] + flags, cwd=root)
+    else:
+        cmd = ['mypy', '--ignore-missing-imports']
+        cache_dir = state_path(f"mypy-cache{root_slug(root)}")
+        if cache_dir:
+            # Keep the incremental cache in one place whatever directory the hook runs from
+            cmd += ['--cache-dir', str(cache_dir)]
 
-        if found:
-            issues.append({
-                'check': 'Secrets',
-                'status': 'WARN',
-                'count': len(found),
-                'preview': '\n'.join(found[:3])
-            })
+        def run(flags: list[str]) -> tuple[int, str]:
+            # One process sees the whole program; only split when the command line would be too long
+            return run_batched(lambda files: cmd + flags + files, py_files, root)
 
+    code, output = run(['-O', 'json'])
+    if code == 2 and 'unrecognized arguments' in output:
+        code, output = run(['--show-column-numbers', '--show-error-codes', '--no-pretty'])
+    return code, output
+
+
+def daemon_request(request: dict, timeout: float = 2.0) -> Optional[dict]:
+    """Send one JSON request to the checker daemon; None if it is not running."""
+    sock_path = state_path('daemon.sock')
+    if not (DAEMON_ENABLED and hasattr(socket, 'AF_UNIX') and sock_path and sock_path.exists()):
+        return None
+    if _deadline is not None:
+        timeout = max(0.1, min(timeout, _deadline - time.monotonic()))
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(sock_path))
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            with sock.makefile('rb') as reply:
+                return json.loads(reply.readline())
+    except (OSError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def daemon_running() -> bool:
+    """Whether a checker daemon answers for this repository."""
+    reply = daemon_request({'check': 'ping'}, timeout=0.5)
+    return bool(reply and reply.get('ok'))
+
+
+class TscWatcher:
+    """Keeps `tsc --watch` running and remembers its latest complete report."""
+
+    STARTED = ('Starting compilation in watch mode', 'Starting incremental compilation')
+    FOUND = re.compile(r'Found (\d+) errors?\.')
+
+    def __init__(self, root: Path):
+        self.cond = threading.Condition()
+        self.building = False
+        self.started = 0.0
+        self.report: Optional[tuple[float, int, str]] = None
+        self.lines: list[str] = []
+        self.proc = subprocess.Popen(
+            node_bin('tsc', root) + ['--noEmit', '--pretty', 'false', '--watch', '--preserveWatchOutput'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            cwd=root
+        )
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            line = line.rstrip('\n')
+            with self.cond:
+                found = self.FOUND.search(line)
+                if any(marker in line for marker in self.STARTED):
+                    self.building = True
+                    self.started = time.time()
+                    self.lines = []
+                elif found:
+                    self.report = (self.started, 1 if int(found.group(1)) else 0, '\n'.join(self.lines))
+                    self.building = False
+                    self.cond.notify_all()
+                elif line.strip():
+                    self.lines.append(line)
+        with self.cond:
+            self.cond.notify_all()
+
+    def result(self, since: float, timeout: float) -> Optional[tuple[int, str]]:
+        """The latest report that started after `since`, waiting up to timeout.
+
+        `since` is the newest mtime among the staged inputs, so a report that
+        started later has seen them. None when tsc has not caught up in time.
+        """
+        def ready() -> bool:
+            return not self.building and self.report is not None and self.report[0] >= since
+
+        with self.cond:
+            self.cond.wait_for(lambda: ready() or self.proc.poll() is not None, timeout)
+            if ready():
+                return self.report[1], self.report[2]
+        return None
+
+    def stop(self):
+        self.proc.terminate()
+
+
+class CheckerDaemon:
+    """Long-lived helper serving warm check results over a Unix socket.
+
+    Requests and replies are single JSON lines. The daemon owns one tsc
+    watcher per TypeScript package (started with the daemon for the current
+    directory, on first request for nested packages) and starts dmypy and
+    eslint_d, which the hook then talks to directly while the daemon answers
+    pings.
+    """
+
+    def __init__(self, sock_path: Path, project_type: str):
+        self.sock_path = sock_path
+        self.tsc: dict[Path, TscWatcher] = {}
+        self.tsc_lock = threading.Lock()
+        self.helpers: list[list[str]] = []
+        if project_type == 'node':
+            self.watcher(Path.cwd())
+            eslint_d = shutil.which('eslint_d', path=str(Path.cwd() / 'node_modules' / '.bin')) or shutil.which('eslint_d')
+            if eslint_d:
+                self.helpers.append([eslint_d])
+        elif project_type == 'python' and shutil.which('dmypy'):
+            self.helpers.append(['dmypy', '--status-file', str(sock_path.with_name('dmypy.json'))])
+        for helper in self.helpers:
+            run_command(helper + ['start'])
+
+    def watcher(self, root: Path) -> Optional[TscWatcher]:
+        """The tsc watcher for a package inside this repository, started on demand."""
+        root = root.resolve()
+        top = repo_root().resolve()
+        if (root != top and top not in root.parents) or not (root / 'tsconfig.json').is_file():
+            return None
+        with self.tsc_lock:
+            if root not in self.tsc:
+                self.tsc[root] = TscWatcher(root)
+            return self.tsc[root]
+
+    def dispatch(self, request: dict) -> dict:
+        check = request.get('check')
+        if check == 'ping':
+            return {'ok': True, 'tsc': [str(root) for root in self.tsc]}
+        watcher = self.watcher(Path(request.get('root', Path.cwd()))) if check == 'tsc' else None
+        if watcher:
+            result = watcher.result(float(request.get('since', 0)), min(float(request.get('timeout', DAEMON_WAIT)), 30))
+            if result is None:
+                return {'error': 'tsc --watch has not caught up'}
+            return {'code': result[0], 'output': result[1]}
+        return {'error': f"unsupported request: {check}"}
+
+    def serve(self):
+        checker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                except ValueError:
+                    return
+                if request.get('check') == 'stop':
+                    threading.Thread(target=self.server.shutdown).start()
+                    reply = {'ok': True}
+                else:
+                    reply = checker.dispatch(request)
+                self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+        server = socketserver.ThreadingUnixStreamServer(str(self.sock_path), Handler)
+        server.daemon_threads = True
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+        print(f"Checker daemon listening on {self.sock_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.close()
+
+    def close(self):
+        for watcher in self.tsc.values():
+            watcher.stop()
+        for helper in self.helpers:
+            run_command(helper + ['stop'])
+        # dmypy servers the hook started itself: nested projects, and the repo
+        # root when the daemon was not started with a dmypy helper of its own
+        for status_file in self.sock_path.parent.glob('dmypy*.json'):
+            run_command(['dmypy', '--status-file', str(status_file), 'stop'])
+        try:
+            self.sock_path.unlink()
+        except OSError:
+            pass
+
+
+def start_daemon() -> int:
+    """Run the checker daemon in the foreground until stopped."""
+    sock_path = state_path('daemon.sock')
+    if not hasattr(socket, 'AF_UNIX') or sock_path is None:
+        print("Checker daemon needs Unix sockets and a git repository")
+        return 1
+    if daemon_running():
+        print(f"Checker daemon already running on {sock_path}")
+        return 1
+    sock_path.parent.mkdir(exist_ok=True)
+    if sock_path.exists():
+        sock_path.unlink()
+    CheckerDaemon(sock_path, detect_project_type()).serve()
+    return 0
+
+
+def stop_daemon() -> int:
+    reply = daemon_request({'check': 'stop'})
+    print("Checker daemon stopped" if reply else "No checker daemon running")
+    return 0 if reply else 1
+
+
+def run_timed(timing: CheckTiming, check: Callable[[], list[dict]]) -> list[dict]:
+    start = time.monotonic()
+    try:
+        return timed(timing, check)
+    finally:
+        timing.wall = time.monotonic() - start
+
+
+def run_checks(checks: list[Check], budget: float = CHECK_BUDGET) -> list[dict]:
+    """Run checks concurrently within one overall time budget.
+
+    Issues come back in the order the checks were listed, whatever order they
+    finish in, so the output is stable. Commands still running when the budget
+    is spent are killed and reported as timed out. Each check's timing is
+    left in _timings.
+    """
+    global _deadline
+    _timings.clear()
+    if not checks:
+        return []
+
+    _deadline = time.monotonic() + budget
+    _timed_out.clear()
+    issues = []
+    # Every check mostly waits on a subprocess; the cap only matters for big monorepos
+    with ThreadPoolExecutor(max_workers=min(len(checks), max(4, BATCH_JOBS))) as pool:
+        futures = []
+        for name, check, files in checks:
+            timing = CheckTiming(name, files)
+            _timings.append(timing)
+            futures.append((name, pool.submit(run_timed, timing, check)))
+        for name, future in futures:
+            try:
+                issues.extend(future.result())
+            except Exception as e:
+                issues.append({'check': name, 'status': 'WARN', 'count': 1, 'preview': f"Check crashed: {e}"})
+    _deadline = None
+
+    if _timed_out:
+        issues.append({
+            'check': 'Time budget',
+            'status': 'WARN',
+            'count': len(_timed_out),
+            'preview': f"Stopped after {budget:g}s: " + ', '.join(_timed_out)
+        })
     return issues
 
 
+def log_timings(timings: list[CheckTiming], total: float):
+    """Append this run's timings as one compact JSON line."""
+    log = state_path('timings.jsonl')
+    if log is None or not timings:
+        return
+    entry = {'ts': round(time.time()), 'total_ms': round(total * 1000), 'checks': [t.record() for t in timings]}
+    try:
+        if log.exists() and log.stat().st_size > TIMINGS_MAX_BYTES:
+            # Keep the newer half so the log stays small
+            lines = log.read_text(encoding='utf-8').splitlines()
+            log.write_text('\n'.join(lines[len(lines) // 2:]) + '\n', encoding='utf-8')
+        with open(log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+    except OSError:
+        pass
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def show_stats(runs: int) -> int:
+    """Print p50/p95 wall and subprocess time per check over recent runs."""
+    log = state_path('timings.jsonl')
+    entries = []
+    if log and log.exists():
+        for line in log.read_text(encoding='utf-8').splitlines()[-runs:]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    if not entries:
+        print("No timings recorded yet")
+        return 1
+
+    by_check: dict[str, list[dict]] = {}
+    for entry in entries:
+        for record in entry.get('checks', []):
+            by_check.setdefault(record['check'], []).append(record)
+
+    print(f"Pre-commit timings over the last {len(entries)} run(s)")
+    print(f"{'check':<32} {'runs':>5} {'p50 ms':>8} {'p95 ms':>8} {'sub p50':>8} {'files':>6}")
+    rows = [('total', [e['total_ms'] for e in entries], [], [])]
+    rows += [(name, [r['wall_ms'] for r in records], [r['sub_ms'] for r in records], [r['files'] for r in records])
+             for name, records in by_check.items()]
+    for name, wall, sub, files in sorted(rows, key=lambda row: -percentile(row[1], 95)):
+        sub_p50 = f"{percentile(sub, 50):.0f}" if sub else '-'
+        files_p50 = f"{percentile(files, 50):.0f}" if files else '-'
+        print(f"{name[:32]:<32} {len(wall):>5} {percentile(wall, 50):>8.0f} {percentile(wall, 95):>8.0f} "
+              f"{sub_p50:>8} {files_p50:>6}")
+    return 0
+
+
 def main():
-    project_type = detect_project_type()
-    all_issues = []
+    parser = argparse.ArgumentParser(description='Pre-commit checks')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Serve warm tsc/dmypy/eslint_d results to later runs (foreground)')
+    parser.add_argument('--stop-daemon', action='store_true', help='Stop a running checker daemon')
+    parser.add_argument('--stats', nargs='?', type=int, const=50, metavar='RUNS',
+                        help='Show p50/p95 timings per check over the last RUNS runs (default 50)')
+    args = parser.parse_args()
+    if args.stats:
+        sys.exit(show_stats(args.stats))
+    if args.daemon:
+        sys.exit(start_daemon())
+    if args.stop_daemon:
+        sys.exit(stop_daemon())
+
+    snapshot = staged_snapshot()
+    roots = project_roots(snapshot.files)
+    kinds = sorted({kind for kind, _ in roots})
+    project_type = '+'.join(kinds) if kinds else detect_project_type()
 
-    # Run checks based on project type
-    if project_type == 'node':
-        all_issues.extend(check_node())
-    elif project_type == 'python':
-        all_issues.extend(check_python())
+    # Pick checks for each project root that has staged files
+    checks = []
+    for (kind, root), files in roots.items():
+        if kind == 'node':
+            checks.extend(node_checks(root, files))
+        elif kind == 'python':
+            checks.extend(python_checks(root, files))
 
     # Always check for secrets
-    all_issues.extend(check_secrets())
+    if snapshot.status:
+        checks.append(('Secrets', check_secrets, len(snapshot.status)))
+
+    started = time.monotonic()
+    all_issues = run_checks(checks)
+    log_timings(_timings, time.monotonic() - started)
 
     # Output results
     if not all_issues: